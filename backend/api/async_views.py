@@ -0,0 +1,95 @@
+import asyncio
+import contextvars
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+from django.urls import URLPattern
+
+# Действия viewset, которые выполняются в пуле потоков. Запись остаётся
+# в потоке, который Django отводит синхронным view
+ASYNC_ACTIONS = {'list', 'retrieve'}
+
+
+@lru_cache(maxsize=None)
+def get_executor():
+    """Пул потоков для синхронного кода view под ASGI, один на процесс.
+
+    Без него Django выполняет синхронные view по очереди в одном потоке.
+    """
+    return ThreadPoolExecutor(
+        max_workers=getattr(settings, 'ASYNC_VIEW_WORKERS', 8),
+        thread_name_prefix='async-views',
+    )
+
+
+def _render(view, request, *args, **kwargs):
+    response = view(request, *args, **kwargs)
+    if hasattr(response, 'render'):
+        response.render()
+    return response
+
+
+def _call(view, request, *args, **kwargs):
+    """Соединения потоков пула не закрываются сигналами запроса"""
+    close_old_connections()
+    try:
+        return _render(view, request, *args, **kwargs)
+    finally:
+        close_old_connections()
+
+
+def _is_async_action(view, method):
+    """HEAD DRF обрабатывает действием GET"""
+    method = 'get' if method == 'HEAD' else method.lower()
+    return view.actions.get(method) in ASYNC_ACTIONS
+
+
+def _has_async_actions(pattern):
+    actions = getattr(pattern.callback, 'actions', {})
+    return bool(ASYNC_ACTIONS & set(actions.values()))
+
+
+def async_view(view):
+    """Асинхронная обёртка над view DRF.
+
+    ORM и сериализаторы в этой версии Django и DRF синхронные, поэтому
+    list и retrieve целиком, вместе с отрисовкой ответа, выполняются в пуле
+    потоков, а цикл событий в это время обслуживает другие запросы.
+    Переменные контекста (метрики запроса) передаются в поток. Остальные
+    методы того же адреса выполняются так же, как синхронные view.
+    """
+    @functools.wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        if not _is_async_action(view, request.method):
+            return await sync_to_async(_render)(
+                view, request, *args, **kwargs)
+        loop = asyncio.get_running_loop()
+        context = contextvars.copy_context()
+        return await loop.run_in_executor(
+            get_executor(),
+            functools.partial(
+                context.run, _call, view, request, *args, **kwargs)
+        )
+
+    return wrapper
+
+
+def async_patterns(patterns):
+    """Те же адреса, если включен ASYNC_VIEWS, адреса с list и retrieve
+    получают асинхронные view"""
+    if not getattr(settings, 'ASYNC_VIEWS', False):
+        return patterns
+    return [
+        URLPattern(
+            pattern.pattern,
+            async_view(pattern.callback),
+            pattern.default_args,
+            pattern.name,
+        )
+        if _has_async_actions(pattern) else pattern
+        for pattern in patterns
+    ]
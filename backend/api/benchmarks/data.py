@@ -0,0 +1,181 @@
+import os
+from random import Random
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
+from django.db import transaction
+
+from api import counters, shopping_list, timeline
+from recipes import search
+from recipes.models import AmountIngredient, Ingredient, Recipe, Tag
+from users.models import Subscription, User
+
+# Все пользователи набора начинаются с PREFIX, по нему набор и удаляется
+PREFIX = 'bench_'
+PASSWORD = 'bench-password'
+INGREDIENTS_PATH = os.path.join(
+    os.path.dirname(settings.BASE_DIR), 'data', 'ingredients.csv')
+IMAGE = 'recipes/images/bench.png'
+BATCH_SIZE = 500
+
+TAGS = [
+    ('Завтрак', '#E26C2D', 'breakfast'),
+    ('Обед', '#49B64E', 'lunch'),
+    ('Ужин', '#8775D2', 'dinner'),
+    ('Десерт', '#F2C94C', 'dessert'),
+    ('Выпечка', '#EB5757', 'baking'),
+]
+DISHES = ['Салат', 'Суп', 'Рагу', 'Запеканка', 'Пирог', 'Паста', 'Омлет']
+
+
+def _zipf_weights(size, exponent=0.8):
+    """Немногие авторы и рецепты популярнее остальных"""
+    return [1 / (rank + 1) ** exponent for rank in range(size)]
+
+
+def _weighted_sample(random, population, weights, k):
+    """k разных элементов с вероятностью, пропорциональной весу"""
+    keys = sorted(
+        zip(population, weights),
+        key=lambda item: random.random() ** (1 / item[1]),
+        reverse=True,
+    )
+    return [item for item, _ in keys[:k]]
+
+
+def _chunks(items, size=BATCH_SIZE):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def clear():
+    """Удаляет пользователей набора вместе с их рецептами и связями"""
+    with transaction.atomic():
+        deleted, _ = User.objects.filter(
+            username__startswith=PREFIX).delete()
+    shopping_list.rebuild()
+    return deleted
+
+
+def _ensure_catalogue(ingredients_path):
+    tags = [
+        Tag.objects.get_or_create(
+            slug=slug, defaults={'name': name, 'color': color})[0].pk
+        for name, color, slug in TAGS
+    ]
+    if not Ingredient.objects.exists():
+        call_command('load_ingredients', ingredients_path, verbosity=0)
+    return tags, list(Ingredient.objects.values_list('pk', 'name'))
+
+
+def _create_users(count):
+    password = make_password(PASSWORD)
+    User.objects.bulk_create([
+        User(
+            username=f'{PREFIX}{number}',
+            email=f'{PREFIX}{number}@example.com',
+            first_name='Тест',
+            last_name=f'Пользователь {number}',
+            password=password,
+        )
+        for number in range(count)
+    ], batch_size=BATCH_SIZE)
+    return list(User.objects.filter(
+        username__startswith=PREFIX).order_by('pk').values_list(
+            'pk', flat=True))
+
+
+def _create_recipes(random, count, users, tags, ingredients):
+    authors = users[:]
+    random.shuffle(authors)
+    weights = _zipf_weights(len(authors))
+    Recipe.objects.bulk_create([
+        Recipe(
+            author_id=random.choices(authors, weights)[0],
+            name=f'{random.choice(DISHES)}: {random.choice(ingredients)[1]}',
+            text=' '.join(name for _, name in random.sample(ingredients, 5)),
+            cooking_time=random.randint(5, 180),
+            image=IMAGE,
+        )
+        for _ in range(count)
+    ], batch_size=BATCH_SIZE)
+    recipes = list(Recipe.objects.filter(
+        author__username__startswith=PREFIX).order_by('pk').values_list(
+            'pk', flat=True))
+
+    Recipe.tags.through.objects.bulk_create([
+        Recipe.tags.through(recipe_id=recipe, tag_id=tag)
+        for recipe in recipes
+        for tag in random.sample(tags, random.randint(1, 3))
+    ], batch_size=BATCH_SIZE)
+    AmountIngredient.objects.bulk_create([
+        AmountIngredient(
+            recipe_id=recipe,
+            ingredient_id=ingredient,
+            amount=random.randint(1, 500),
+        )
+        for recipe in recipes
+        for ingredient, _ in random.sample(
+            ingredients, random.randint(3, 12))
+    ], batch_size=BATCH_SIZE)
+    return recipes
+
+
+def _create_relations(random, users, recipes, subscriptions, favorites,
+                      cart):
+    authors = list(Recipe.objects.filter(pk__in=recipes).order_by(
+        'author_id').values_list('author_id', flat=True).distinct())
+    author_weights = _zipf_weights(len(authors))
+    popular = recipes[:]
+    random.shuffle(popular)
+    recipe_weights = _zipf_weights(len(popular))
+
+    follows, favorite_links, cart_links = [], [], []
+    for user in users:
+        follows += [
+            Subscription(user_id=user, author_id=author)
+            for author in _weighted_sample(
+                random, authors, author_weights, subscriptions + 1)
+            if author != user
+        ][:subscriptions]
+        favorite_links += [
+            Recipe.favorite.through(user_id=user, recipe_id=recipe)
+            for recipe in _weighted_sample(
+                random, popular, recipe_weights, favorites)
+        ]
+        cart_links += [
+            Recipe.shopping_carts.through(user_id=user, recipe_id=recipe)
+            for recipe in random.sample(recipes, min(cart, len(recipes)))
+        ]
+
+    Subscription.objects.bulk_create(follows, batch_size=BATCH_SIZE)
+    Recipe.favorite.through.objects.bulk_create(
+        favorite_links, batch_size=BATCH_SIZE)
+    Recipe.shopping_carts.through.objects.bulk_create(
+        cart_links, batch_size=BATCH_SIZE)
+
+
+def generate(users, recipes, subscriptions, favorites, cart, seed=1,
+             ingredients_path=INGREDIENTS_PATH):
+    """Создаёт воспроизводимый набор данных: при одинаковых параметрах и
+    seed получаются одинаковые рецепты и связи.
+
+    Данные пишутся через bulk_create без сигналов, поэтому счётчики,
+    поисковый индекс, списки покупок и ленты подписок пересчитываются
+    в конце.
+    """
+    random = Random(seed)
+    with transaction.atomic():
+        tags, ingredients = _ensure_catalogue(ingredients_path)
+        user_ids = _create_users(users)
+        recipe_ids = _create_recipes(
+            random, recipes, user_ids, tags, ingredients)
+        _create_relations(
+            random, user_ids, recipe_ids, subscriptions, favorites, cart)
+        counters.reconcile()
+        for chunk in _chunks(recipe_ids):
+            search.update_index(chunk)
+    shopping_list.rebuild()
+    timeline.rebuild()
+    return {'users': len(user_ids), 'recipes': len(recipe_ids)}
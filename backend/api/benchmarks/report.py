@@ -0,0 +1,122 @@
+import json
+import statistics
+import subprocess
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.db import connection
+
+from recipes.models import Recipe
+from users.models import User
+
+from .data import PREFIX
+
+# Поле отчёта, подпись и множитель для вывода
+METRICS = [
+    ('p50', 'p50, мс', 1000),
+    ('p95', 'p95, мс', 1000),
+    ('p99', 'p99, мс', 1000),
+    ('rps', 'запр/с', 1),
+    ('queries', 'запросов к БД', 1),
+]
+
+
+def summarize(latencies, queries, errors, total):
+    """Перцентили задержки, пропускная способность и запросы к базе на
+    один запрос"""
+    quantiles = statistics.quantiles(latencies, n=100, method='inclusive')
+    return {
+        'requests': len(latencies),
+        'p50': quantiles[49],
+        'p95': quantiles[94],
+        'p99': quantiles[98],
+        'rps': len(latencies) / total,
+        'queries': statistics.mean(queries),
+        'errors': errors,
+    }
+
+
+def _commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            cwd=settings.BASE_DIR,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def build(results, iterations, warmup, seed):
+    return {
+        'commit': _commit(),
+        'created': datetime.now(timezone.utc).isoformat(),
+        'database': connection.vendor,
+        'dataset': {
+            'users': User.objects.filter(
+                username__startswith=PREFIX).count(),
+            'recipes': Recipe.objects.filter(
+                author__username__startswith=PREFIX).count(),
+        },
+        'iterations': iterations,
+        'warmup': warmup,
+        'seed': seed,
+        'scenarios': results,
+    }
+
+
+def save(data, path):
+    with open(path, 'w', encoding='utf-8') as file:
+        json.dump(data, file, ensure_ascii=False, indent=2)
+
+
+def load(path):
+    with open(path, encoding='utf-8') as file:
+        return json.load(file)
+
+
+def _header(data):
+    dataset = data['dataset']
+    return (
+        f'{data["commit"] or "-"} {data["database"]}, '
+        f'пользователей: {dataset["users"]}, '
+        f'рецептов: {dataset["recipes"]}, '
+        f'повторов: {data["iterations"]}'
+    )
+
+
+def format_report(data):
+    lines = [_header(data)]
+    lines.append(f'{"":>22}' + ''.join(
+        f'{label:>15}' for _, label, _ in METRICS) + f'{"ошибок":>8}')
+    for name, result in data['scenarios'].items():
+        lines.append(f'{name:>22}' + ''.join(
+            f'{result[key] * scale:>15.1f}' for key, _, scale in METRICS
+        ) + f'{result["errors"]:>8}')
+    return lines
+
+
+def _change(old, new):
+    if not old:
+        return '-'
+    return f'{(new - old) / old * 100:+.1f}%'
+
+
+def format_diff(base, new):
+    """Сравнение двух сохранённых отчётов по сценариям, которые есть в
+    обоих"""
+    lines = [f'было:  {_header(base)}', f'стало: {_header(new)}']
+    for name, result in new['scenarios'].items():
+        old = base['scenarios'].get(name)
+        if old is None:
+            continue
+        lines.append(name)
+        for key, label, scale in METRICS:
+            lines.append(
+                f'  {label:>15}: {old[key] * scale:>10.1f} -> '
+                f'{result[key] * scale:>10.1f} '
+                f'{_change(old[key], result[key]):>8}'
+            )
+    return lines
@@ -0,0 +1,188 @@
+import base64
+import io
+import time
+from collections import OrderedDict
+from random import Random
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.test.utils import override_settings
+from django.urls import reverse
+from PIL import Image
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from api import shopping_list
+from recipes.images import delete_unreferenced
+from recipes.models import Ingredient, Recipe, Tag
+from users.models import User
+
+from . import report
+from .data import PREFIX, TAGS
+
+# Адрес, под которым клиент обращается к приложению
+SERVER_NAME = '127.0.0.1'
+
+# Кэш прогона. Если такого алиаса нет в CACHES, используется кэш в памяти
+BENCHMARK_CACHE = 'benchmark'
+FALLBACK_CACHE = {
+    'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    'LOCATION': 'benchmark',
+}
+
+
+def _image():
+    buffer = io.BytesIO()
+    Image.new('RGB', (64, 64), '#E26C2D').save(buffer, 'PNG')
+    encoded = base64.b64encode(buffer.getvalue()).decode()
+    return f'data:image/png;base64,{encoded}'
+
+
+class Context:
+    """Клиенты и данные, общие для всех сценариев одного прогона"""
+
+    def __init__(self, seed):
+        self.random = Random(seed)
+        self.user = User.objects.filter(
+            username__startswith=PREFIX).order_by('pk').first()
+        token, _ = Token.objects.get_or_create(user=self.user)
+        self.anonymous = APIClient(SERVER_NAME=SERVER_NAME)
+        self.client = APIClient(SERVER_NAME=SERVER_NAME)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+        tags = Tag.objects.filter(slug__in=[slug for *_, slug in TAGS])
+        self.tags = list(tags.values_list('slug', flat=True))
+        self.tag_ids = list(tags.values_list('pk', flat=True))
+        self.ingredients = list(
+            Ingredient.objects.values_list('pk', flat=True))
+        self.image = _image()
+        self.created = []
+
+    def random_tags(self):
+        return self.random.sample(
+            self.tags, min(len(self.tags), self.random.randint(1, 2)))
+
+
+def recipes_anonymous(context):
+    return context.anonymous.get(reverse('recipe-list'), {
+        'tags': context.random_tags(),
+        'page': context.random.randint(1, 3),
+    })
+
+
+def recipes_authenticated(context):
+    return context.client.get(reverse('recipe-list'), {
+        'tags': context.random_tags(),
+        'page': context.random.randint(1, 3),
+    })
+
+
+def recipe_create(context):
+    response = context.client.post(reverse('recipe-list'), {
+        'name': 'Тестовый рецепт',
+        'text': 'Описание тестового рецепта',
+        'cooking_time': context.random.randint(5, 180),
+        'image': context.image,
+        'tags': context.random.sample(context.tag_ids, 2),
+        'ingredients': [
+            {'id': ingredient, 'amount': context.random.randint(1, 500)}
+            for ingredient in context.random.sample(context.ingredients, 5)
+        ],
+    }, format='json')
+    if response.status_code == 201:
+        context.created.append(response.data['id'])
+    return response
+
+
+def subscriptions(context):
+    return context.client.get(
+        reverse('subscriptions'), {'recipes_limit': 3})
+
+
+def shopping_cart_pdf(context):
+    """Повторная загрузка: PDF из кэша"""
+    return context.client.get(reverse('download_shopping_cart'))
+
+
+def shopping_cart_pdf_cold(context):
+    """Загрузка после изменения корзины: список читается из базы и PDF
+    рисуется заново"""
+    digest = cache.get(shopping_list.DIGEST_KEY.format(context.user.pk))
+    if digest is not None:
+        cache.delete(shopping_list.PDF_KEY.format(digest))
+    shopping_list.invalidate([context.user.pk])
+    return context.client.get(reverse('download_shopping_cart'))
+
+
+SCENARIOS = OrderedDict([
+    ('recipes_anonymous', recipes_anonymous),
+    ('recipes_authenticated', recipes_authenticated),
+    ('recipe_create', recipe_create),
+    ('subscriptions', subscriptions),
+    ('shopping_cart_pdf', shopping_cart_pdf),
+    ('shopping_cart_pdf_cold', shopping_cart_pdf_cold),
+])
+
+
+class QueryCounter:
+    """Считает запросы к базе, не сохраняя их текст"""
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+def _measure(scenario, context, iterations, warmup):
+    for _ in range(warmup):
+        scenario(context)
+    latencies, queries, errors = [], [], 0
+    counter = QueryCounter()
+    start = time.perf_counter()
+    with connection.execute_wrapper(counter):
+        for _ in range(iterations):
+            before = counter.count
+            request_start = time.perf_counter()
+            response = scenario(context)
+            latencies.append(time.perf_counter() - request_start)
+            queries.append(counter.count - before)
+            errors += response.status_code >= 400
+    return report.summarize(
+        latencies, queries, errors, time.perf_counter() - start)
+
+
+def get_caches():
+    """CACHES прогона: кэш по умолчанию заменяется отдельным, поэтому
+    очистка перед прогоном и после него не трогает рабочий кэш"""
+    config = settings.CACHES.get(BENCHMARK_CACHE, FALLBACK_CACHE)
+    return {'default': config, BENCHMARK_CACHE: config}
+
+
+def run(names, iterations, warmup, seed=1):
+    """Прогоняет сценарии через URLconf приложения.
+
+    Всё выполняется в одной транзакции, которая откатывается в конце, так
+    что созданные рецепты не меняют набор данных для следующих прогонов.
+    """
+    if not User.objects.filter(username__startswith=PREFIX).exists():
+        return None
+    with override_settings(CACHES=get_caches()):
+        return _run(names, iterations, warmup, seed)
+
+
+def _run(names, iterations, warmup, seed):
+    results = OrderedDict()
+    with transaction.atomic():
+        cache.clear()
+        context = Context(seed)
+        for name in names:
+            results[name] = _measure(
+                SCENARIOS[name], context, iterations, warmup)
+        images = list(Recipe.objects.filter(
+            pk__in=context.created).values_list('image', flat=True))
+        transaction.set_rollback(True)
+    delete_unreferenced(images)
+    cache.clear()
+    return results
@@ -0,0 +1,46 @@
+import hashlib
+import time
+
+from django.core.cache import cache
+
+VERSION_KEY = 'catalogue:version'
+BODY_KEY = 'catalogue:{}:{}'
+BODY_TIMEOUT = 60 * 60 * 24
+
+
+def _now():
+    return int(time.time() * 1000)
+
+
+def get_version():
+    """Версия справочников (тэги и ингредиенты) - время последнего
+    изменения в миллисекундах.
+
+    Если версия пропала из кэша, начинается новая, чтобы клиенты не
+    получили 304 на устаревшие данные.
+    """
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        cache.add(VERSION_KEY, _now(), None)
+        return cache.get(VERSION_KEY, _now())
+    return version
+
+
+def bump():
+    """Меняет версию справочников после изменения тэгов или ингредиентов"""
+    version = max(_now(), cache.get(VERSION_KEY, 0) + 1)
+    cache.set(VERSION_KEY, version, None)
+    return version
+
+
+def _body_key(path, version):
+    return BODY_KEY.format(version, hashlib.md5(path.encode()).hexdigest())
+
+
+def get_body(path, version):
+    """Сохранённый ответ справочника для этой версии"""
+    return cache.get(_body_key(path, version))
+
+
+def set_body(path, version, data):
+    cache.set(_body_key(path, version), data, BODY_TIMEOUT)
@@ -0,0 +1,42 @@
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from recipes.models import Recipe
+from users.models import Subscription, User
+
+# Счётчик, модель связи и поле связи, по которому он считается
+COUNTERS = [
+    (Recipe, 'favorites_count', Recipe.favorite.through, 'recipe'),
+    (User, 'recipes_count', Recipe, 'author'),
+    (User, 'followers_count', Subscription, 'author'),
+]
+
+
+def change(model, pk_list, field, delta):
+    """Атомарно меняет счётчик на delta без чтения строки"""
+    model.objects.filter(pk__in=pk_list).update(**{field: F(field) + delta})
+
+
+def actual_count(related_model, related_field):
+    return Coalesce(Subquery(
+        related_model.objects.filter(
+            **{related_field: OuterRef('pk')}
+        ).order_by().values(related_field).annotate(
+            total=Count('pk')
+        ).values('total')
+    ), 0)
+
+
+def reconcile():
+    """Исправляет расхождения счётчиков с реальным количеством связей,
+    возвращает число исправленных строк по каждому счётчику"""
+    fixed = {}
+    for model, field, related_model, related_field in COUNTERS:
+        ids = list(model.objects.annotate(
+            actual=actual_count(related_model, related_field)
+        ).exclude(**{field: F('actual')}).values_list('pk', flat=True))
+        if ids:
+            model.objects.filter(pk__in=ids).update(
+                **{field: actual_count(related_model, related_field)})
+        fixed[f'{model.__name__}.{field}'] = len(ids)
+    return fixed
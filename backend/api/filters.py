@@ -1,7 +1,9 @@
+from django.db.models import Exists, OuterRef, Q
 from django_filters.rest_framework.backends import DjangoFilterBackend
 from rest_framework import filters
 
-from users.models import User
+from recipes import search
+from recipes.models import Recipe
 
 
 class IngredientSearchFilterBackend(filters.SearchFilter):
@@ -9,26 +11,53 @@ class IngredientSearchFilterBackend(filters.SearchFilter):
 
 
 class RecipeFilterBackend(DjangoFilterBackend):
+    """Фильтры рецептов через EXISTS-подзапросы по таблицам связей,
+    поэтому строки рецептов не размножаются и DISTINCT не нужен.
+
+    Параметр search - полнотекстовый поиск по названию и описанию,
+    результаты сортируются по релевантности.
+    """
+
     def filter_queryset(self, request, queryset, view):
         params = request.query_params
+        user = request.user
 
         is_favorited = params.get('is_favorited')
         is_in_shopping_cart = params.get('is_in_shopping_cart')
         author_id = params.get('author')
         tags = params.getlist('tags')
+        query = params.get('search', '')
 
-        if is_favorited is not None and is_favorited == '1':
-            queryset = queryset.filter(favorite=request.user)
+        if '1' in (is_favorited, is_in_shopping_cart) and (
+                not user.is_authenticated):
+            return queryset.none()
 
-        if is_in_shopping_cart is not None and is_in_shopping_cart == '1':
-            queryset = queryset.filter(shopping_carts__id=request.user.id)
+        conditions = []
 
-        if author_id is not None and User.objects.filter(
-                pk=author_id).exists():
-            queryset = queryset.filter(author_id=author_id)
+        if is_favorited == '1':
+            conditions.append(Exists(
+                Recipe.favorite.through.objects.filter(
+                    recipe=OuterRef('pk'), user=user)
+            ))
 
-        if tags:
-            regular_tags = '|'.join(tags)
-            queryset = queryset.filter(tags__slug__regex=regular_tags)
+        if is_in_shopping_cart == '1':
+            conditions.append(Exists(
+                Recipe.shopping_carts.through.objects.filter(
+                    recipe=OuterRef('pk'), user=user)
+            ))
 
-        return queryset.distinct()
+        if author_id is not None and author_id.isdigit():
+            conditions.append(Q(author_id=author_id))
+
+        if tags:
+            conditions.append(Exists(
+                Recipe.tags.through.objects.filter(
+                    recipe=OuterRef('pk'), tag__slug__in=tags)
+            ))
+
+        match = search.matches(query)
+        if match is None:
+            return queryset.filter(*conditions)
+        return queryset.filter(match, *conditions).annotate(
+            search_rank=search.rank(query)
+        ).order_by('-search_rank', *Recipe._meta.ordering)
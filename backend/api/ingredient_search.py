@@ -0,0 +1,92 @@
+import threading
+from bisect import bisect_left
+
+from api import catalogue
+from recipes.models import Ingredient
+
+MAX_RESULTS = 50
+
+EXACT, PREFIX, WORD_PREFIX = range(3)
+
+
+def normalize(text):
+    """Приводит название к виду для поиска: регистр и "ё" не важны"""
+    return ' '.join(text.casefold().replace('ё', 'е').split())
+
+
+class IngredientIndex:
+    """Отсортированный индекс названий ингредиентов в памяти процесса.
+
+    Ключи индекса - нормализованное название и каждое его слово, поэтому
+    поиск по префиксу сводится к двум бинарным поискам. Индекс
+    пересобирается, когда меняется версия справочников.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None
+        self._data = [], [], [], []
+
+    def _build(self):
+        entries = list(
+            Ingredient.objects.values('id', 'name', 'measurement_unit')
+            .order_by('id')
+        )
+        names = [normalize(entry['name']) for entry in entries]
+        pairs = []
+        for position, name in enumerate(names):
+            pairs.append((name, position))
+            words = name.split(' ')
+            for i in range(1, len(words)):
+                pairs.append((' '.join(words[i:]), position))
+        pairs.sort()
+        self._data = (
+            entries,
+            names,
+            [key for key, _ in pairs],
+            [position for _, position in pairs],
+        )
+
+    def _ensure_fresh(self):
+        version = catalogue.get_version()
+        if version == self._version:
+            return
+        with self._lock:
+            if version != self._version:
+                self._build()
+                self._version = version
+
+    def search(self, query, limit=MAX_RESULTS):
+        """Ингредиенты, название которых или одно из слов начинается с
+        query. Сначала точные совпадения, затем по началу названия"""
+        self._ensure_fresh()
+        entries, names, keys, positions = self._data
+        query = normalize(query)
+        if not query:
+            return list(entries)
+
+        start = bisect_left(keys, query)
+        end = bisect_left(keys, query + '\uffff', start)
+        ranked = {}
+        for position in positions[start:end]:
+            name = names[position]
+            if name == query:
+                rank = EXACT
+            elif name.startswith(query):
+                rank = PREFIX
+            else:
+                rank = WORD_PREFIX
+            if rank < ranked.get(position, WORD_PREFIX + 1):
+                ranked[position] = rank
+
+        order = sorted(
+            ranked,
+            key=lambda position: (
+                ranked[position], len(names[position]),
+                names[position], position
+            )
+        )
+        return [entries[position] for position in order[:limit]]
+
+
+ingredient_index = IngredientIndex()
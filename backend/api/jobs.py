@@ -0,0 +1,130 @@
+import logging
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import close_old_connections
+from django.db.models import F
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from api import replicas, timeline
+from recipes.models import Job
+
+logger = logging.getLogger(__name__)
+
+# Тип задачи и функция, которая по задаче возвращает имя файла и содержимое
+HANDLERS = {
+    'shopping_list_pdf': 'api.shopping_list.export_pdf',
+}
+ACTIVE = (Job.Status.QUEUED, Job.Status.RUNNING)
+MAINTENANCE_INTERVAL = 60
+
+
+def enqueue(user, kind):
+    """Ставит задачу в очередь. Если такая задача пользователя уже ждёт
+    или выполняется, возвращает её"""
+    # Статус задачи пользователь сразу запрашивает GET-запросами
+    replicas.pin_to_primary(user.pk)
+    return (
+        Job.objects.filter(user=user, kind=kind, status__in=ACTIVE).first()
+        or Job.objects.create(user=user, kind=kind)
+    )
+
+
+def claim():
+    """Забирает первую задачу из очереди.
+
+    Задача переводится в running условным UPDATE, поэтому несколько
+    обработчиков не возьмут одну задачу и без SELECT ... FOR UPDATE.
+    """
+    candidates = Job.objects.filter(
+        status=Job.Status.QUEUED).order_by('id').values_list('id', flat=True)
+    for job_id in candidates[:10]:
+        claimed = Job.objects.filter(
+            pk=job_id, status=Job.Status.QUEUED
+        ).update(
+            status=Job.Status.RUNNING,
+            started=timezone.now(),
+            attempts=F('attempts') + 1,
+        )
+        if claimed:
+            return Job.objects.select_related('user').get(pk=job_id)
+    return None
+
+
+def run(job):
+    """Выполняет задачу и сохраняет результат или ошибку"""
+    try:
+        filename, content = import_string(HANDLERS[job.kind])(job)
+    except Exception as error:
+        logger.exception('Job %s failed', job.pk)
+        job.status = Job.Status.FAILED
+        job.error = f'{type(error).__name__}: {error}'
+    else:
+        job.result.save(filename, ContentFile(content), save=False)
+        job.filename = filename
+        job.status = Job.Status.DONE
+    job.finished = timezone.now()
+    job.save()
+    return job
+
+
+def requeue_stale():
+    """Возвращает в очередь задачи, обработчик которых не закончил их за
+    JOB_TIMEOUT секунд, после JOB_MAX_ATTEMPTS попыток - помечает ошибкой"""
+    stale = Job.objects.filter(
+        status=Job.Status.RUNNING,
+        started__lt=timezone.now() - timedelta(
+            seconds=getattr(settings, 'JOB_TIMEOUT', 600)),
+    )
+    failed = stale.filter(
+        attempts__gte=getattr(settings, 'JOB_MAX_ATTEMPTS', 3)
+    ).update(
+        status=Job.Status.FAILED,
+        error='Превышено время выполнения',
+        finished=timezone.now(),
+    )
+    requeued = stale.update(status=Job.Status.QUEUED)
+    return requeued, failed
+
+
+def prune():
+    """Удаляет завершённые задачи старше JOB_RESULT_TTL секунд вместе с
+    файлами, на которые не ссылаются другие задачи"""
+    old = Job.objects.exclude(status__in=ACTIVE).filter(
+        finished__lt=timezone.now() - timedelta(
+            seconds=getattr(settings, 'JOB_RESULT_TTL', 60 * 60 * 24)))
+    names = set(old.exclude(result='').values_list('result', flat=True))
+    deleted, _ = old.delete()
+    names -= set(Job.objects.filter(
+        result__in=names).values_list('result', flat=True))
+    for name in names:
+        Job.result.field.storage.delete(name)
+    return deleted
+
+
+def work(poll_interval=1, once=False, should_stop=lambda: False):
+    """Цикл обработчика: выполняет задачи по одной, пока очередь не пуста,
+    потом ждёт poll_interval секунд. Зависшие и старые задачи и
+    переполненные ленты проверяются раз в MAINTENANCE_INTERVAL секунд"""
+    processed = 0
+    maintained = 0
+    while not should_stop():
+        close_old_connections()
+        if time.monotonic() - maintained >= MAINTENANCE_INTERVAL:
+            requeue_stale()
+            prune()
+            timeline.trim_overflowing()
+            maintained = time.monotonic()
+        job = claim()
+        if job is not None:
+            run(job)
+            processed += 1
+            continue
+        if once:
+            break
+        time.sleep(poll_interval)
+    close_old_connections()
+    return processed
@@ -0,0 +1,80 @@
+import base64
+import time
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.test.utils import override_settings
+from rest_framework.authentication import (BasicAuthentication,
+                                           TokenAuthentication)
+from rest_framework.authtoken.models import Token
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from api.authentication import CachedTokenAuthentication
+from api.benchmarks import scenarios
+from users.models import User
+
+EMAIL = 'bench-auth@example.com'
+PASSWORD = 'bench-auth-password'
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает процессорное время на проверку одного запроса: '
+            'Basic, токен без кэша и токен с кэшем')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=20,
+            help='Сколько запросов проверить каждым способом',
+        )
+
+    def _measure(self, authentication, header, repeat):
+        factory = APIRequestFactory()
+        cpu = wall = 0
+        for _ in range(repeat):
+            request = Request(factory.get('/', HTTP_AUTHORIZATION=header))
+            cpu_start, wall_start = time.process_time(), time.perf_counter()
+            user, _ = authentication.authenticate(request)
+            cpu += time.process_time() - cpu_start
+            wall += time.perf_counter() - wall_start
+            if user.email != EMAIL:
+                raise CommandError(
+                    f'{type(authentication).__name__} вернул {user.email}')
+        return cpu / repeat, wall / repeat
+
+    @transaction.atomic
+    def _run(self, repeat):
+        """Замеры в транзакции, которая откатывается"""
+        user = User.objects.create_user(EMAIL, 'bench-auth', PASSWORD)
+        token = Token.objects.create(user=user)
+        basic = base64.b64encode(f'{EMAIL}:{PASSWORD}'.encode()).decode()
+        results = []
+        for name, authentication, header in (
+            ('Basic', BasicAuthentication(), f'Basic {basic}'),
+            ('Token', TokenAuthentication(), f'Token {token.key}'),
+            ('Token + кэш', CachedTokenAuthentication(), f'Token {token.key}'),
+        ):
+            results.append(
+                (name, self._measure(authentication, header, repeat)))
+        transaction.set_rollback(True)
+        return results
+
+    def handle(self, *args, **options):
+        repeat = options['repeat']
+        # Отдельный кэш прогона: очистка не трогает рабочий кэш
+        with override_settings(CACHES=scenarios.get_caches()):
+            cache.clear()
+            try:
+                results = self._run(repeat)
+            finally:
+                cache.clear()
+
+        self.stdout.write(f'Запросов на способ: {repeat}')
+        for name, (cpu, wall) in results:
+            self.stdout.write(
+                f'{name:>12}: CPU {cpu * 1000:.3f} мс, '
+                f'всего {wall * 1000:.3f} мс на запрос'
+            )
@@ -0,0 +1,103 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections, connections
+from django.db.backends.signals import connection_created
+from django.test.utils import override_settings
+from rest_framework.test import APIClient
+
+DUMMY_CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'},
+}
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает задержку запроса с новым соединением с базой на '
+            'каждый запрос (CONN_MAX_AGE=0) и с постоянным соединением '
+            'воркера')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--path',
+            default='/api/tags/',
+            help='Адрес для проверки',
+        )
+        parser.add_argument(
+            '--requests',
+            type=int,
+            default=300,
+            help='Сколько запросов выполнить в каждом режиме',
+        )
+        parser.add_argument(
+            '--max-age',
+            type=int,
+            default=600,
+            help='CONN_MAX_AGE постоянного соединения',
+        )
+        parser.add_argument(
+            '--database',
+            default='default',
+        )
+        parser.add_argument(
+            '--with-cache',
+            action='store_true',
+            help='Не отключать кэш: справочники тогда не читают базу',
+        )
+
+    def _run(self, client, path, requests):
+        """Запросы с тем же закрытием соединений, что у обработчика
+        Django: тестовый клиент close_old_connections не вызывает"""
+        opened = []
+
+        def created(**kwargs):
+            opened.append(kwargs['connection'].alias)
+
+        connection_created.connect(created, weak=False)
+        timings = []
+        try:
+            for _ in range(requests):
+                start = time.perf_counter()
+                close_old_connections()
+                response = client.get(path)
+                close_old_connections()
+                timings.append(time.perf_counter() - start)
+                if response.status_code != 200:
+                    raise CommandError(
+                        f'{path} ответил {response.status_code}')
+        finally:
+            connection_created.disconnect(created)
+        return timings, len(opened)
+
+    def handle(self, *args, **options):
+        connection = connections[options['database']]
+        original = connection.settings_dict['CONN_MAX_AGE']
+        client = APIClient(SERVER_NAME='127.0.0.1')
+        caches = {} if options['with_cache'] else {'CACHES': DUMMY_CACHES}
+        self.stdout.write(
+            f'{options["path"]}, {connection.vendor}, '
+            f'запросов на режим: {options["requests"]}'
+        )
+        try:
+            with override_settings(**caches):
+                for name, max_age in (
+                        ('CONN_MAX_AGE=0', 0),
+                        (f'CONN_MAX_AGE={options["max_age"]}',
+                         options['max_age'])):
+                    connection.settings_dict['CONN_MAX_AGE'] = max_age
+                    connection.close()
+                    timings, opened = self._run(
+                        client, options['path'], options['requests'])
+                    self._report(name, timings, opened)
+        finally:
+            connection.settings_dict['CONN_MAX_AGE'] = original
+            connection.close()
+
+    def _report(self, name, timings, opened):
+        percentiles = statistics.quantiles(timings, n=100)
+        self.stdout.write(
+            f'{name:>18}: среднее {statistics.mean(timings) * 1000:.2f} мс, '
+            f'p50 {percentiles[49] * 1000:.2f} мс, '
+            f'p95 {percentiles[94] * 1000:.2f} мс, '
+            f'открыто соединений: {opened}'
+        )
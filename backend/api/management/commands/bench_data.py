@@ -0,0 +1,63 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from api.benchmarks import data
+
+
+class Command(BaseCommand):
+    help = ('Создаёт воспроизводимый набор данных для нагрузочных тестов: '
+            'пользователей, рецепты, подписки, избранное и корзины')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=200)
+        parser.add_argument('--recipes', type=int, default=1000)
+        parser.add_argument(
+            '--subscriptions',
+            type=int,
+            default=10,
+            help='Подписок у каждого пользователя',
+        )
+        parser.add_argument(
+            '--favorites',
+            type=int,
+            default=20,
+            help='Рецептов в избранном у каждого пользователя',
+        )
+        parser.add_argument(
+            '--cart',
+            type=int,
+            default=5,
+            help='Рецептов в корзине у каждого пользователя',
+        )
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument(
+            '--ingredients',
+            default=data.INGREDIENTS_PATH,
+            help='Файл ингредиентов, если справочник пуст',
+        )
+        parser.add_argument(
+            '--clear',
+            action='store_true',
+            help='Только удалить ранее созданный набор',
+        )
+
+    def handle(self, *args, **options):
+        deleted = data.clear()
+        if options['clear']:
+            self.stdout.write(f'Удалено объектов: {deleted}')
+            return
+        if options['users'] < 1 or options['recipes'] < 1:
+            raise CommandError('Нужен хотя бы один пользователь и рецепт')
+
+        created = data.generate(
+            users=options['users'],
+            recipes=options['recipes'],
+            subscriptions=options['subscriptions'],
+            favorites=options['favorites'],
+            cart=options['cart'],
+            seed=options['seed'],
+            ingredients_path=options['ingredients'],
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'Пользователей: {created["users"]}, '
+            f'рецептов: {created["recipes"]}'
+        ))
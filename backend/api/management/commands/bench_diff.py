@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from api.benchmarks import report
+
+
+class Command(BaseCommand):
+    help = 'Сравнивает два отчёта bench_run --save'
+
+    def add_arguments(self, parser):
+        parser.add_argument('base', help='Отчёт до изменений')
+        parser.add_argument('new', help='Отчёт после изменений')
+
+    def handle(self, *args, **options):
+        lines = report.format_diff(
+            report.load(options['base']), report.load(options['new']))
+        for line in lines:
+            self.stdout.write(line)
@@ -0,0 +1,60 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from api.filters import IngredientSearchFilterBackend
+from api.ingredient_search import ingredient_index
+from api.views import IngredientViewSet
+from recipes.models import Ingredient
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает поиск ингредиентов по индексу в памяти '
+            'с фильтром SearchFilter по базе')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=20,
+            help='Сколько раз повторить набор запросов',
+        )
+
+    def _queries(self):
+        """Префиксы, как их набирает пользователь: 1-4 первые буквы"""
+        names = Ingredient.objects.values_list('name', flat=True)[::50]
+        return [name[:length] for name in names for length in range(1, 5)]
+
+    def _filter_backend(self, query):
+        request = Request(APIRequestFactory().get(
+            '/', {IngredientSearchFilterBackend.search_param: query}))
+        return list(IngredientSearchFilterBackend().filter_queryset(
+            request, Ingredient.objects.all(), IngredientViewSet
+        ).values('id', 'name', 'measurement_unit'))
+
+    def _measure(self, search, queries, repeat):
+        start = time.perf_counter()
+        for _ in range(repeat):
+            for query in queries:
+                search(query)
+        return (time.perf_counter() - start) / (repeat * len(queries))
+
+    def handle(self, *args, **options):
+        queries = self._queries()
+        if not queries:
+            raise CommandError('Нет ингредиентов для проверки поиска')
+        ingredient_index.search('')
+
+        results = [
+            ('SearchFilter', self._measure(
+                self._filter_backend, queries, options['repeat'])),
+            ('IngredientIndex', self._measure(
+                ingredient_index.search, queries, options['repeat'])),
+        ]
+        self.stdout.write(f'Запросов: {len(queries)} x {options["repeat"]}')
+        for name, seconds in results:
+            self.stdout.write(f'{name:>16}: {seconds * 1000:.3f} мс/запрос')
+        self.stdout.write(
+            f'Ускорение: {results[0][1] / results[1][1]:.1f}x')
@@ -0,0 +1,126 @@
+import itertools
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from django.core.management.base import BaseCommand, CommandError
+
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает пропускную способность и задержку запущенных '
+            'серверов (например, WSGI и ASGI) на запросах чтения при '
+            'одинаковом числе одновременных запросов')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'targets',
+            nargs='+',
+            help='Серверы в виде имя=адрес, например '
+                 'wsgi=http://127.0.0.1:8001 asgi=http://127.0.0.1:8002',
+        )
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            default=16,
+            help='Сколько запросов выполняется одновременно',
+        )
+        parser.add_argument(
+            '--requests',
+            type=int,
+            default=500,
+            help='Сколько запросов отправить каждому серверу',
+        )
+        parser.add_argument(
+            '--token',
+            help='Токен пользователя, добавляет в набор подписки',
+        )
+        parser.add_argument(
+            '--path',
+            action='append',
+            dest='paths',
+            help='Адрес для проверки вместо набора по умолчанию',
+        )
+
+    def _paths(self, options):
+        if options['paths']:
+            return options['paths']
+        paths = [
+            '/api/recipes/',
+            '/api/recipes/?limit=10',
+            '/api/tags/',
+            '/api/ingredients/?name=с',
+        ]
+        recipe = Recipe.objects.values_list('pk', flat=True).first()
+        if recipe is not None:
+            paths.append(f'/api/recipes/{recipe}/')
+        if options['token']:
+            paths.append('/api/users/subscriptions/?recipes_limit=3')
+        return paths
+
+    def _run(self, url, paths, headers, options):
+        local = threading.local()
+
+        def get(path):
+            if not hasattr(local, 'session'):
+                local.session = requests.Session()
+                local.session.headers.update(headers)
+            start = time.perf_counter()
+            response = local.session.get(url + path)
+            return time.perf_counter() - start, response.ok
+
+        with ThreadPoolExecutor(options['concurrency']) as executor:
+            list(executor.map(get, paths * options['concurrency']))
+            queue = itertools.islice(
+                itertools.cycle(paths), options['requests'])
+            start = time.perf_counter()
+            results = list(executor.map(get, queue))
+            total = time.perf_counter() - start
+
+        latencies = sorted(latency for latency, _ in results)
+        quantiles = statistics.quantiles(latencies, n=100)
+        return {
+            'rps': len(results) / total,
+            'p50': quantiles[49],
+            'p95': quantiles[94],
+            'p99': quantiles[98],
+            'errors': sum(not ok for _, ok in results),
+        }
+
+    def handle(self, *args, **options):
+        targets = []
+        for target in options['targets']:
+            name, _, url = target.partition('=')
+            if not url:
+                raise CommandError(f'Ожидается имя=адрес: {target}')
+            targets.append((name, url.rstrip('/')))
+        if options['requests'] < 2:
+            raise CommandError('Нужно хотя бы два запроса')
+
+        headers = {}
+        if options['token']:
+            headers['Authorization'] = f'Token {options["token"]}'
+        paths = self._paths(options)
+
+        self.stdout.write(
+            f'Запросов: {options["requests"]}, '
+            f'одновременно: {options["concurrency"]}'
+        )
+        for path in paths:
+            self.stdout.write(f'  {path}')
+        self.stdout.write(
+            f'{"":>8} {"запр/с":>8} {"p50, мс":>8} {"p95, мс":>8} '
+            f'{"p99, мс":>8} {"ошибок":>7}'
+        )
+        for name, url in targets:
+            result = self._run(url, paths, headers, options)
+            self.stdout.write(
+                f'{name:>8} {result["rps"]:>8.1f} '
+                f'{result["p50"] * 1000:>8.1f} '
+                f'{result["p95"] * 1000:>8.1f} '
+                f'{result["p99"] * 1000:>8.1f} '
+                f'{result["errors"]:>7}'
+            )
@@ -0,0 +1,52 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from api.benchmarks import report, scenarios
+
+
+class Command(BaseCommand):
+    help = ('Прогоняет сценарии нагрузочного теста через URLconf и выводит '
+            'задержку, пропускную способность и запросы к базе')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--scenario',
+            action='append',
+            dest='scenarios',
+            choices=scenarios.SCENARIOS,
+            help='Сценарий, по умолчанию - все',
+        )
+        parser.add_argument(
+            '--iterations',
+            type=int,
+            default=100,
+            help='Сколько запросов на сценарий',
+        )
+        parser.add_argument(
+            '--warmup',
+            type=int,
+            default=5,
+            help='Сколько запросов выполнить до замеров',
+        )
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument(
+            '--save',
+            help='Сохранить отчёт в JSON для сравнения через bench_diff',
+        )
+
+    def handle(self, *args, **options):
+        if options['iterations'] < 2:
+            raise CommandError('Нужно хотя бы два повтора')
+        names = options['scenarios'] or list(scenarios.SCENARIOS)
+        results = scenarios.run(
+            names, options['iterations'], options['warmup'], options['seed'])
+        if results is None:
+            raise CommandError('Нет данных, сначала выполните bench_data')
+
+        data = report.build(
+            results, options['iterations'], options['warmup'],
+            options['seed'])
+        for line in report.format_report(data):
+            self.stdout.write(line)
+        if options['save']:
+            report.save(data, options['save'])
+            self.stdout.write(f'Отчёт сохранён в {options["save"]}')
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from recipes.images import collect_garbage
+
+
+class Command(BaseCommand):
+    help = ('Удаляет файлы фото рецептов и их копий, на которые не '
+            'ссылается ни один рецепт')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--min-age',
+            type=int,
+            default=60 * 60,
+            help='Не трогать файлы моложе стольких секунд',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Только показать, сколько файлов будет удалено',
+        )
+
+    def handle(self, *args, **options):
+        count, size = collect_garbage(options['min_age'], options['dry_run'])
+        action = 'Будет удалено' if options['dry_run'] else 'Удалено'
+        self.stdout.write(self.style.SUCCESS(
+            f'{action} файлов: {count}, {size / 1024 / 1024:.1f} МБ'))
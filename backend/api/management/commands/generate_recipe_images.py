@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+
+from recipes.images import generate_variants, get_executor
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    help = 'Создаёт уменьшенные копии фото для уже опубликованных рецептов'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            help='Пересоздать копии и у рецептов, где они уже есть',
+        )
+
+    def handle(self, *args, **options):
+        recipes = Recipe.objects.exclude(image='')
+        if not options['all']:
+            recipes = recipes.filter(image_variants={})
+        ids = list(recipes.values_list('id', flat=True))
+
+        failed = 0
+        futures = [get_executor().submit(generate_variants, recipe_id)
+                   for recipe_id in ids]
+        for recipe_id, future in zip(ids, futures):
+            try:
+                future.result()
+            except Exception as error:
+                failed += 1
+                self.stderr.write(f'Рецепт {recipe_id}: {error}')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Обработано рецептов: {len(ids) - failed}, ошибок: {failed}'))
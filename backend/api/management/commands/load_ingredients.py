@@ -0,0 +1,140 @@
+import csv
+import io
+import json
+import os
+import time
+from itertools import islice
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from api import catalogue
+from recipes.models import Ingredient
+
+CHUNK_SIZE = 64 * 1024
+JSON_SEPARATORS = ' \t\r\n,'
+
+
+def read_csv(file):
+    for row in csv.reader(file):
+        if len(row) >= 2:
+            yield row[0], row[1]
+
+
+def read_json(file):
+    """Потоково читает JSON-массив объектов, не загружая файл целиком"""
+    decoder = json.JSONDecoder()
+    buffer = file.read(CHUNK_SIZE).lstrip()
+    if not buffer.startswith('['):
+        raise CommandError('Ожидался JSON-массив ингредиентов')
+    buffer = buffer[1:]
+    while True:
+        buffer = buffer.lstrip(JSON_SEPARATORS)
+        if buffer.startswith(']'):
+            return
+        try:
+            item, end = decoder.raw_decode(buffer)
+        except json.JSONDecodeError:
+            chunk = file.read(CHUNK_SIZE)
+            if not chunk:
+                raise CommandError('Файл JSON оборван')
+            buffer += chunk
+            continue
+        buffer = buffer[end:]
+        yield item['name'], item['measurement_unit']
+
+
+READERS = {
+    'csv': read_csv,
+    'json': read_json,
+}
+
+
+class Command(BaseCommand):
+    help = ('Загружает справочник ингредиентов из CSV или JSON пачками, '
+            'пропуская уже существующие')
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Файл ingredients.csv или .json')
+        parser.add_argument(
+            '--format',
+            choices=READERS,
+            help='Формат файла, по умолчанию - по расширению',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Сколько строк записывать за одну транзакцию',
+        )
+
+    def _batches(self, rows, size):
+        rows = iter(rows)
+        while True:
+            chunk = list(islice(rows, size))
+            if not chunk:
+                return
+            batch = {
+                (name.strip(), measurement_unit.strip()): None
+                for name, measurement_unit in chunk
+                if name.strip() and measurement_unit.strip()
+            }
+            if batch:
+                yield list(batch)
+
+    def _insert_copy(self, batch):
+        """COPY пачки во временную таблицу и вставка новых строк"""
+        data = io.StringIO()
+        csv.writer(data).writerows(batch)
+        data.seek(0)
+        table = Ingredient._meta.db_table
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'CREATE TEMP TABLE ingredient_load '
+                '(name varchar(200), measurement_unit varchar(200)) '
+                'ON COMMIT DROP'
+            )
+            cursor.copy_expert(
+                'COPY ingredient_load FROM STDIN WITH (FORMAT csv)', data)
+            cursor.execute(
+                f'INSERT INTO {table} (name, measurement_unit) '
+                f'SELECT name, measurement_unit FROM ingredient_load '
+                f'ON CONFLICT (name, measurement_unit) DO NOTHING'
+            )
+
+    def _insert_bulk(self, batch):
+        Ingredient.objects.bulk_create(
+            [Ingredient(name=name, measurement_unit=measurement_unit)
+             for name, measurement_unit in batch],
+            ignore_conflicts=True,
+        )
+
+    def handle(self, *args, **options):
+        path = options['path']
+        file_format = options['format'] or (
+            os.path.splitext(path)[1].lstrip('.').lower())
+        if file_format not in READERS:
+            raise CommandError(f'Неизвестный формат файла: {path}')
+        if options['batch_size'] < 1:
+            raise CommandError('Размер пачки должен быть больше нуля')
+
+        insert = (self._insert_copy if connection.vendor == 'postgresql'
+                  else self._insert_bulk)
+        start = time.perf_counter()
+        before = Ingredient.objects.count()
+        read = 0
+
+        with open(path, encoding='utf-8', newline='') as file:
+            rows = READERS[file_format](file)
+            for batch in self._batches(rows, options['batch_size']):
+                with transaction.atomic():
+                    insert(batch)
+                read += len(batch)
+
+        added = Ingredient.objects.count() - before
+        if added:
+            catalogue.bump()
+        self.stdout.write(self.style.SUCCESS(
+            f'Прочитано: {read}, добавлено: {added}, '
+            f'время: {time.perf_counter() - start:.2f} с'
+        ))
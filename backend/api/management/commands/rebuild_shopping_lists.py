@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Q
+
+from api import shopping_list
+from users.models import User
+
+
+class Command(BaseCommand):
+    help = ('Пересобирает предрассчитанные списки покупок и сверяет их '
+            'с подсчётом по корзинам')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help='Только сверить списки, не пересобирая их',
+        )
+
+    def handle(self, *args, **options):
+        if not options['check']:
+            count = shopping_list.rebuild()
+            self.stdout.write(f'Пересобрано позиций: {count}')
+
+        users = User.objects.filter(
+            Q(shopping_cart__isnull=False) | Q(shopping_list__isnull=False)
+        ).distinct()
+        mismatched = [
+            user.username for user in users.iterator()
+            if shopping_list.get_shopping_list(user)
+            != shopping_list.get_live_shopping_list(user)
+        ]
+        if mismatched:
+            raise CommandError(
+                f'Списки покупок расходятся у пользователей: '
+                f'{", ".join(mismatched)}'
+            )
+        self.stdout.write(self.style.SUCCESS('Списки покупок совпадают'))
@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from api import timeline
+
+
+class Command(BaseCommand):
+    help = ('Заново собирает ленты подписок, например после изменения '
+            'FEED_LENGTH или FEED_FANOUT_LIMIT')
+
+    def handle(self, *args, **options):
+        count = timeline.rebuild()
+        self.stdout.write(self.style.SUCCESS(f'Записей в лентах: {count}'))
@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from api import counters
+
+
+class Command(BaseCommand):
+    help = ('Сверяет счётчики избранного, рецептов и подписчиков '
+            'с реальными данными и исправляет расхождения')
+
+    def handle(self, *args, **options):
+        for counter, fixed in counters.reconcile().items():
+            self.stdout.write(f'{counter}: исправлено {fixed}')
@@ -0,0 +1,39 @@
+import signal
+
+from django.core.management.base import BaseCommand
+
+from api import jobs
+
+
+class Command(BaseCommand):
+    help = ('Обработчик фоновых задач: забирает задачи из очереди в базе и '
+            'выполняет их по одной. Процессов можно запустить несколько')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--poll-interval',
+            type=float,
+            default=1,
+            help='Сколько секунд ждать, когда очередь пуста',
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Выполнить задачи из очереди и выйти',
+        )
+
+    def handle(self, *args, **options):
+        stopping = []
+
+        def stop(signum, frame):
+            """Текущая задача доделывается, новые не берутся"""
+            stopping.append(signum)
+
+        signal.signal(signal.SIGTERM, stop)
+        signal.signal(signal.SIGINT, stop)
+        processed = jobs.work(
+            options['poll_interval'],
+            once=options['once'],
+            should_stop=lambda: bool(stopping),
+        )
+        self.stdout.write(f'Выполнено задач: {processed}')
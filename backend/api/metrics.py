@@ -0,0 +1,271 @@
+import glob
+import heapq
+import json
+import os
+import tempfile
+import threading
+import time
+from contextvars import ContextVar
+from functools import lru_cache
+
+from django.conf import settings
+
+TIME_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200)
+
+LABELS = ('view', 'method', 'status')
+DB_LABELS = ('database',)
+
+# Имя гистограммы, описание, границы корзин и метки
+HISTOGRAMS = {
+    'foodgram_request_duration_seconds': (
+        'Время обработки запроса', TIME_BUCKETS, LABELS),
+    'foodgram_request_db_seconds': (
+        'Время SQL-запросов за один запрос', TIME_BUCKETS, LABELS),
+    'foodgram_request_queries': (
+        'Число SQL-запросов за один запрос', COUNT_BUCKETS, LABELS),
+    'foodgram_request_serialize_seconds': (
+        'Время сериализации и рендеринга ответа DRF', TIME_BUCKETS, LABELS),
+    'foodgram_db_connect_seconds': (
+        'Время открытия нового соединения с базой', TIME_BUCKETS, DB_LABELS),
+}
+# Имя счётчика, описание и метки
+COUNTERS = {
+    'foodgram_db_checkouts_total': (
+        'Получения соединения с базой запросом: reused - постоянное, '
+        'new - новое, reconnect - взамен неисправного',
+        DB_LABELS + ('result',)
+    ),
+}
+# Имя показателя, описание и метки. Текущие значения, а не сумма по
+# воркерам: считываются при каждом запросе /api/metrics/
+GAUGES = {
+    'foodgram_db_pooler_waiting_clients': (
+        'Клиенты pgbouncer, ждущие соединения с базой', DB_LABELS),
+    'foodgram_db_pooler_max_wait_seconds': (
+        'Самое долгое ожидание клиента в очереди pgbouncer', DB_LABELS),
+}
+SLOWEST_QUERIES = 5
+
+_current = ContextVar('request_metrics', default=None)
+
+
+class RequestMetrics:
+    """SQL-запросы и время этапов одного запроса"""
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.queries = 0
+        self.sql_time = 0.0
+        self.slowest = []
+        self.view_start = None
+        self.view_sql_time = 0.0
+        self.serialize = None
+
+    def add_query(self, sql, duration):
+        self.queries += 1
+        self.sql_time += duration
+        item = (duration, self.queries, sql)
+        if len(self.slowest) < SLOWEST_QUERIES:
+            heapq.heappush(self.slowest, item)
+        else:
+            heapq.heappushpop(self.slowest, item)
+
+    def view_started(self):
+        self.view_start = time.perf_counter()
+        self.view_sql_time = self.sql_time
+
+    def rendered(self, response=None):
+        """Время от начала view до конца рендеринга без SQL-запросов"""
+        if self.view_start is not None:
+            self.serialize = (
+                time.perf_counter() - self.view_start
+                - (self.sql_time - self.view_sql_time)
+            )
+
+    def slowest_queries(self):
+        return [(duration, sql) for duration, _, sql in sorted(
+            self.slowest, reverse=True)]
+
+
+def start_request():
+    metrics = RequestMetrics()
+    return metrics, _current.set(metrics)
+
+
+def finish_request(token):
+    _current.reset(token)
+
+
+def current():
+    """Метрики текущего запроса или None вне запроса"""
+    return _current.get()
+
+
+def record_query(execute, sql, params, many, context):
+    """execute_wrapper: засекает запрос, если он выполняется в рамках
+    запроса с метриками"""
+    metrics = _current.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.add_query(sql, time.perf_counter() - start)
+
+
+def install(connection):
+    """Подключает record_query к соединению один раз"""
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+class Registry:
+    """Гистограммы по view в памяти процесса.
+
+    Каждый процесс (воркер gunicorn) раз в flush_interval секунд сбрасывает
+    изменившиеся значения в файл <pid>.json в общем каталоге из фонового
+    потока, а ответ для Prometheus суммирует все файлы.
+    """
+
+    def __init__(self, directory, flush_interval=1):
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._pid = None
+        self._data = {}
+        self._dirty = False
+
+    def _path(self, pid):
+        return os.path.join(self.directory, f'{pid}.json')
+
+    def _state(self):
+        """После fork воркер продолжает свой файл, а не данные мастера"""
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._data = self._read(self._path(self._pid))
+            self._dirty = False
+            threading.Thread(
+                target=self._flush_periodically,
+                name='metrics-flush',
+                daemon=True,
+            ).start()
+        return self._data
+
+    @staticmethod
+    def _read(path):
+        try:
+            with open(path, encoding='utf-8') as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            return {}
+
+    def observe(self, labels, values):
+        """Добавляет значения одного запроса в гистограммы"""
+        key = '\t'.join(labels)
+        with self._lock:
+            state = self._state()
+            for name, value in values.items():
+                buckets = HISTOGRAMS[name][1]
+                series = state.setdefault(name, {}).setdefault(
+                    key, [0] * (len(buckets) + 2))
+                for index, bound in enumerate(buckets):
+                    if value <= bound:
+                        series[index] += 1
+                        break
+                series[-2] += value
+                series[-1] += 1
+            self._dirty = True
+
+    def increment(self, name, labels, value=1):
+        """Увеличивает счётчик"""
+        key = '\t'.join(labels)
+        with self._lock:
+            series = self._state().setdefault(name, {}).setdefault(key, [0])
+            series[0] += value
+            self._dirty = True
+
+    def _flush_periodically(self):
+        pid = os.getpid()
+        while self._pid == pid:
+            time.sleep(self.flush_interval)
+            if self._dirty:
+                self.flush()
+
+    def flush(self):
+        with self._flush_lock:
+            with self._lock:
+                data = json.dumps(self._state())
+                self._dirty = False
+            os.makedirs(self.directory, exist_ok=True)
+            descriptor, path = tempfile.mkstemp(
+                dir=self.directory, suffix='.tmp')
+            with os.fdopen(descriptor, 'w', encoding='utf-8') as file:
+                file.write(data)
+            os.replace(path, self._path(self._pid))
+
+    def collect(self):
+        """Сумма значений всех процессов, включая завершившиеся"""
+        self.flush()
+        total = {}
+        for path in glob.glob(os.path.join(self.directory, '*.json')):
+            for name, series in self._read(path).items():
+                merged = total.setdefault(name, {})
+                for key, values in series.items():
+                    if key in merged:
+                        merged[key] = [
+                            a + b for a, b in zip(merged[key], values)]
+                    else:
+                        merged[key] = list(values)
+        return total
+
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace(
+        '\n', '\\n')
+
+
+def _labels(names, key, extra=''):
+    pairs = [
+        f'{label}="{_escape(value)}"'
+        for label, value in zip(names, key.split('\t'))
+    ]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}'
+
+
+def render(data):
+    """Текстовый формат Prometheus"""
+    lines = []
+    for name, (description, buckets, names) in HISTOGRAMS.items():
+        lines.append(f'# HELP {name} {description}')
+        lines.append(f'# TYPE {name} histogram')
+        for key, values in sorted(data.get(name, {}).items()):
+            cumulative = 0
+            for bound, count in zip(buckets, values):
+                cumulative += count
+                labels = _labels(names, key, f'le="{bound}"')
+                lines.append(f'{name}_bucket{labels} {cumulative}')
+            labels = _labels(names, key, 'le="+Inf"')
+            lines.append(f'{name}_bucket{labels} {values[-1]}')
+            lines.append(f'{name}_sum{_labels(names, key)} {values[-2]}')
+            lines.append(f'{name}_count{_labels(names, key)} {values[-1]}')
+    for kind, series in (('counter', COUNTERS), ('gauge', GAUGES)):
+        for name, (description, names) in series.items():
+            lines.append(f'# HELP {name} {description}')
+            lines.append(f'# TYPE {name} {kind}')
+            for key, (value,) in sorted(data.get(name, {}).items()):
+                lines.append(f'{name}{_labels(names, key)} {value}')
+    return '\n'.join(lines) + '\n'
+
+
+@lru_cache(maxsize=None)
+def get_registry():
+    return Registry(
+        getattr(settings, 'METRICS_DIR', os.path.join(
+            tempfile.gettempdir(), 'foodgram_metrics')),
+        getattr(settings, 'METRICS_FLUSH_INTERVAL', 1),
+    )
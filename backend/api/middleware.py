@@ -0,0 +1,169 @@
+import asyncio
+import logging
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from rest_framework.permissions import SAFE_METHODS
+
+from api import metrics, replicas
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncCapableMiddleware:
+    """Middleware, которое работает и под WSGI, и под ASGI.
+
+    Под ASGI Django не переводит его в отдельный поток: __call__ возвращает
+    корутину __acall__, как у MiddlewareMixin. Наследники определяют
+    handle(request) для WSGI и корутину __acall__(request) для ASGI.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self):
+            return self.__acall__(request)
+        return self.handle(request)
+
+
+class RequestMetricsMiddleware(AsyncCapableMiddleware):
+    """Число и время SQL-запросов, время сериализации и всего запроса.
+
+    Значения уходят в заголовок Server-Timing и в гистограммы для
+    /api/metrics/, медленные запросы пишутся в лог вместе с самыми долгими
+    SQL-запросами.
+    """
+
+    def handle(self, request):
+        request_metrics, token = metrics.start_request()
+        try:
+            response = self.get_response(request)
+        finally:
+            metrics.finish_request(token)
+        return self._finish(request, response, request_metrics)
+
+    async def __acall__(self, request):
+        request_metrics, token = metrics.start_request()
+        try:
+            response = await self.get_response(request)
+        finally:
+            metrics.finish_request(token)
+        return self._finish(request, response, request_metrics)
+
+    def _finish(self, request, response, request_metrics):
+        total = time.perf_counter() - request_metrics.start
+
+        timings = self._timings(request, request_metrics, total)
+        response['Server-Timing'] = ', '.join(
+            f'{name};dur={duration * 1000:.1f}{description}'
+            for name, duration, description in timings
+        )
+        self._observe(request, response, request_metrics, total)
+        if total >= getattr(settings, 'SLOW_REQUEST_THRESHOLD', 0.5):
+            self._log_slow(request, request_metrics, total)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        metrics.current().view_started()
+
+    def process_template_response(self, request, response):
+        """Ответы DRF рендерятся после view, поэтому сериализация
+        засекается до конца рендеринга"""
+        response.add_post_render_callback(metrics.current().rendered)
+        return response
+
+    @staticmethod
+    def _view_name(request):
+        match = getattr(request, 'resolver_match', None)
+        return match.view_name if match else 'unknown'
+
+    def _timings(self, request, request_metrics, total):
+        timings = []
+        auth = getattr(request, 'auth_duration', None)
+        if auth is not None:
+            timings.append(('auth', auth, ''))
+        timings.append((
+            'db', request_metrics.sql_time,
+            f';desc="{request_metrics.queries} queries"'
+        ))
+        if request_metrics.serialize is not None:
+            timings.append(('serialize', request_metrics.serialize, ''))
+        timings.append(('total', total, ''))
+        return timings
+
+    def _observe(self, request, response, request_metrics, total):
+        values = {
+            'foodgram_request_duration_seconds': total,
+            'foodgram_request_db_seconds': request_metrics.sql_time,
+            'foodgram_request_queries': request_metrics.queries,
+        }
+        if request_metrics.serialize is not None:
+            values['foodgram_request_serialize_seconds'] = (
+                request_metrics.serialize)
+        metrics.get_registry().observe((
+            self._view_name(request),
+            request.method,
+            str(response.status_code),
+        ), values)
+
+    def _log_slow(self, request, request_metrics, total):
+        queries = '\n'.join(
+            f'  {duration * 1000:.1f} ms: {sql[:500]}'
+            for duration, sql in request_metrics.slowest_queries()
+        )
+        logger.warning(
+            'Slow request %s %s (%s): %.1f ms, %d queries, %.1f ms SQL\n%s',
+            request.method,
+            request.get_full_path(),
+            self._view_name(request),
+            total * 1000,
+            request_metrics.queries,
+            request_metrics.sql_time * 1000,
+            queries,
+        )
+
+
+class ReplicaMiddleware(AsyncCapableMiddleware):
+    """Чтение с реплик в безопасных запросах. После успешной записи
+    пользователь на время закрепляется за основной базой"""
+
+    def handle(self, request):
+        token = replicas.start_request(request)
+        try:
+            response = self.get_response(request)
+        finally:
+            replicas.finish_request(token)
+        user_id = self._written_by(request, response)
+        if user_id is not None:
+            replicas.pin_to_primary(user_id)
+        return response
+
+    async def __acall__(self, request):
+        token = replicas.start_request(request)
+        try:
+            response = await self.get_response(request)
+        finally:
+            replicas.finish_request(token)
+        user_id = self._written_by(request, response)
+        if user_id is not None:
+            await sync_to_async(replicas.pin_to_primary)(user_id)
+        return response
+
+    @staticmethod
+    def _written_by(request, response):
+        """Пользователь успешного изменяющего запроса. Ленивый пользователь
+        сессии не загружается: под ASGI это запрос к базе из цикла
+        событий"""
+        if request.method in SAFE_METHODS or response.status_code >= 400:
+            return None
+        user = replicas.get_loaded_user(request)
+        if user is None or not user.is_authenticated:
+            return None
+        return user.pk
@@ -1,22 +1,97 @@
+from django.db import transaction
 from django.shortcuts import get_object_or_404
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
 from rest_framework import mixins, status, viewsets
 from rest_framework.response import Response
 
-from api.serializers import SmallRecipeSerializer
+from api import catalogue, counters, recipe_cache, relations, shopping_list
+from api.serializers import RecipeIdsSerializer, SmallRecipeSerializer
 from api.utils import get_response_as_error
-from recipes.models import Recipe
+from recipes.models import AmountIngredient, Recipe
+from users.models import User
+
+# Связи пользователя с рецептами по имени атрибута у пользователя
+LINKS = {
+    'favorite': Recipe.favorite.through,
+    'shopping_cart': Recipe.shopping_carts.through,
+}
 
 
 class ListViewSet(mixins.ListModelMixin, viewsets.GenericViewSet):
     pass
 
 
+class CatalogueCacheMixin:
+    """Ответы справочников с ETag/Last-Modified по версии справочников.
+
+    Пока версия не меняется, отвечает 304 на If-None-Match или берёт
+    готовый ответ из кэша без обращения к базе.
+    """
+
+    def list(self, request, *args, **kwargs):
+        return self.catalogue_response(
+            super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.catalogue_response(
+            super().retrieve, request, *args, **kwargs)
+
+    def catalogue_response(self, action, request, *args, **kwargs):
+        version = catalogue.get_version()
+        etag = f'"{version}"'
+        last_modified = version // 1000
+
+        response = get_conditional_response(
+            request._request, etag=etag, last_modified=last_modified)
+        if response is None:
+            path = request.get_full_path()
+            data = catalogue.get_body(path, version)
+            if data is None:
+                response = action(request, *args, **kwargs)
+                if response.status_code != status.HTTP_200_OK:
+                    return response
+                catalogue.set_body(path, version, response.data)
+            else:
+                response = Response(data)
+
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(last_modified)
+        patch_cache_control(response, no_cache=True)
+        return response
+
+
+class RecipeCacheMixin:
+    """Список и страница рецепта из кэша представлений, поверх которых
+    накладываются флаги текущего пользователя"""
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        page = self.paginate_queryset(queryset)
+        data = recipe_cache.get_representations(
+            list(queryset) if page is None else page,
+            self.get_serializer_context()
+        )
+        if page is None:
+            return Response(data)
+        return self.get_paginated_response(data)
+
+    def retrieve(self, request, *args, **kwargs):
+        return Response(recipe_cache.get_representations(
+            [self.get_object()], self.get_serializer_context())[0])
+
+
 class CreateDeleteMixin:
+    """Избранное и список покупок: один рецепт по адресу или пакет id.
+
+    Связи пишутся напрямую в промежуточную таблицу под блокировкой строки
+    пользователя, поэтому повторные и параллельные запросы не создают
+    дублей и не сбивают счётчики.
+    """
+
     def custom_create(self, request, id_recipe, attribute):
         recipe = get_object_or_404(Recipe, pk=id_recipe)
-        queryset = getattr(request.user, attribute)
-        if not queryset.filter(id=recipe.id).exists():
-            queryset.add(recipe)
+        if self.add_recipes(request.user, [recipe.id], attribute):
             serializer = SmallRecipeSerializer(
                 recipe, context={'request': request}
             )
@@ -28,11 +103,88 @@ class CreateDeleteMixin:
 
     def custom_destroy(self, request, id_recipe, attribute):
         recipe = get_object_or_404(Recipe, pk=id_recipe)
-        queryset = getattr(request.user, attribute)
-        if queryset.filter(id=recipe.id).exists():
-            queryset.remove(recipe)
+        if self.remove_recipes(request.user, [recipe.id], attribute):
             return Response(status=status.HTTP_204_NO_CONTENT)
         return get_response_as_error(
             f'Рецепта "{recipe.name}" нету в списке',
             status.HTTP_400_BAD_REQUEST
         )
+
+    def custom_batch_create(self, request, attribute):
+        return self._batch(
+            request, attribute, self.add_recipes, 'added', 'already_added')
+
+    def custom_batch_destroy(self, request, attribute):
+        return self._batch(
+            request, attribute, self.remove_recipes, 'removed', 'not_in_list')
+
+    def _batch(self, request, attribute, operation, done, skipped):
+        """Статус по каждому id: рецепты проверяются одним запросом IN,
+        несуществующие получают not_found"""
+        serializer = RecipeIdsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        recipe_ids = list(dict.fromkeys(serializer.validated_data['recipes']))
+        found = set(Recipe.objects.filter(
+            pk__in=recipe_ids).values_list('id', flat=True))
+        changed = set(operation(
+            request.user, [pk for pk in recipe_ids if pk in found], attribute))
+        return Response({'results': [
+            {
+                'id': pk,
+                'status': (
+                    'not_found' if pk not in found
+                    else done if pk in changed else skipped
+                ),
+            }
+            for pk in recipe_ids
+        ]})
+
+    @staticmethod
+    def _lock(user):
+        """Запросы одного пользователя к его спискам идут по очереди"""
+        User.objects.select_for_update().only('pk').get(pk=user.pk)
+
+    def add_recipes(self, user, recipe_ids, attribute):
+        """Добавляет рецепты одной вставкой, возвращает id добавленных"""
+        links = LINKS[attribute]
+        with transaction.atomic():
+            self._lock(user)
+            existing = set(links.objects.filter(
+                user=user, recipe__in=recipe_ids
+            ).values_list('recipe_id', flat=True))
+            added = [pk for pk in recipe_ids if pk not in existing]
+            links.objects.bulk_create(
+                [links(user_id=user.pk, recipe_id=pk) for pk in added],
+                ignore_conflicts=True,
+            )
+            self._changed(user, added, attribute, 1)
+        return added
+
+    def remove_recipes(self, user, recipe_ids, attribute):
+        """Удаляет рецепты одним DELETE, возвращает id удалённых"""
+        links = LINKS[attribute]
+        with transaction.atomic():
+            self._lock(user)
+            removed = list(links.objects.filter(
+                user=user, recipe__in=recipe_ids
+            ).values_list('recipe_id', flat=True))
+            links.objects.filter(user=user, recipe__in=removed).delete()
+            self._changed(user, removed, attribute, -1)
+        return removed
+
+    @staticmethod
+    def _changed(user, recipe_ids, attribute, delta):
+        """Запись идёт мимо m2m_changed, поэтому счётчики, кэш связей и
+        список покупок обновляются здесь"""
+        if not recipe_ids:
+            return
+        transaction.on_commit(lambda: relations.invalidate(user.id))
+        if attribute == 'favorite':
+            counters.change(Recipe, recipe_ids, 'favorites_count', delta)
+        else:
+            shopping_list.refresh(
+                [user.id],
+                AmountIngredient.objects.filter(
+                    recipe__in=recipe_ids
+                ).values_list('ingredient_id', flat=True)
+            )
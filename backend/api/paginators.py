@@ -1,7 +1,151 @@
-from rest_framework.pagination import PageNumberPagination
+import base64
+import binascii
+import json
+from collections import OrderedDict
+from datetime import datetime
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound, ParseError
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
 
 
 class PageLimitPaginator(PageNumberPagination):
     page_size = 6
     page_size_query_param = 'limit'
     max_page_size = 10
+
+
+class KeysetPaginator(BasePagination):
+    """Постраничный вывод по курсору без COUNT и OFFSET.
+
+    Курсор хранит значения полей сортировки последней строки страницы,
+    следующая страница выбирается условием "после этой строки", которое
+    обслуживается индексом по тем же полям.
+
+    Выборка с собственной сортировкой, например поиск по релевантности, по
+    курсору не листается: такой запрос получает 400.
+    """
+    cursor_query_param = 'cursor'
+    page_size = PageLimitPaginator.page_size
+    page_size_query_param = PageLimitPaginator.page_size_query_param
+    max_page_size = PageLimitPaginator.max_page_size
+    ordering = ('-pub_date', '-id')
+    invalid_cursor_message = 'Неверный курсор'
+    ordered_queryset_message = (
+        'Курсор нельзя совмещать с сортировкой по релевантности поиска')
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if size < 1:
+            return self.page_size
+        return min(size, self.max_page_size)
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            position = json.loads(base64.urlsafe_b64decode(encoded))
+        except (binascii.Error, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(position, list) or (
+                len(position) != len(self.ordering)):
+            raise NotFound(self.invalid_cursor_message)
+        return position
+
+    def encode_cursor(self, instance):
+        position = []
+        for field in self.ordering:
+            value = getattr(instance, field.lstrip('-'))
+            if isinstance(value, datetime):
+                value = value.isoformat()
+            position.append(value)
+        return base64.urlsafe_b64encode(
+            json.dumps(position).encode()).decode()
+
+    def get_after_condition(self, position):
+        """Строки, идущие после position при сортировке self.ordering"""
+        condition = Q()
+        equal = Q()
+        for field, value in zip(self.ordering, position):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            condition |= equal & Q(**{f'{name}__{lookup}': value})
+            equal &= Q(**{name: value})
+        return condition
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.ordering = getattr(view, 'cursor_ordering', self.ordering)
+        page_size = self.get_page_size(request)
+        position = self.decode_cursor(request)
+
+        if queryset.query.order_by and (
+                tuple(queryset.query.order_by) != tuple(self.ordering)):
+            raise ParseError(self.ordered_queryset_message)
+        queryset = queryset.order_by(*self.ordering)
+        if position is not None:
+            try:
+                queryset = queryset.filter(
+                    self.get_after_condition(position))
+            except (TypeError, ValueError, ValidationError):
+                raise NotFound(self.invalid_cursor_message)
+
+        return self._cut(list(queryset[:page_size + 1]), page_size)
+
+    def paginate_fetch(self, fetch, request):
+        """Курсор для источника, который сам выбирает строки:
+        fetch(position, limit) возвращает не больше limit объектов после
+        position в порядке self.ordering"""
+        self.request = request
+        page_size = self.get_page_size(request)
+        try:
+            page = fetch(self.decode_cursor(request), page_size + 1)
+        except (TypeError, ValueError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+        return self._cut(page, page_size)
+
+    def _cut(self, page, page_size):
+        self.has_next = len(page) > page_size
+        page = page[:page_size]
+        self.next_cursor = (
+            self.encode_cursor(page[-1]) if self.has_next else None)
+        return page
+
+    def get_next_link(self):
+        if self.next_cursor is None:
+            return None
+        return replace_query_param(
+            self.request.build_absolute_uri(),
+            self.cursor_query_param,
+            self.next_cursor
+        )
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('results', data),
+        ]))
+
+
+class FeedPaginator(PageLimitPaginator):
+    """page/limit по умолчанию, постранично по курсору - если в запросе
+    есть параметр cursor (для первой страницы - пустой)"""
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset = None
+        if KeysetPaginator.cursor_query_param in request.query_params:
+            self.keyset = KeysetPaginator()
+            return self.keyset.paginate_queryset(queryset, request, view)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.keyset is not None:
+            return self.keyset.get_paginated_response(data)
+        return super().get_paginated_response(data)
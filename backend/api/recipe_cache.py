@@ -0,0 +1,89 @@
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models import Prefetch, prefetch_related_objects
+
+from api import catalogue, relations
+from api.serializers import RecipeSerializer
+from api.utils import get_relations
+from recipes.models import AmountIngredient
+
+KEY = 'recipe:{}:{}:{}:{}'
+
+
+def _prefix(request):
+    """Версия справочников и адрес сайта: в теле абсолютные ссылки на фото"""
+    host = hashlib.md5(request.build_absolute_uri('/').encode()).hexdigest()
+    return catalogue.get_version(), host
+
+
+def _key(prefix, recipe):
+    version = int(recipe.updated.timestamp() * 1_000_000)
+    return KEY.format(*prefix, recipe.pk, version)
+
+
+def _serialize(recipes, context):
+    prefetch_related_objects(
+        recipes,
+        'author',
+        'tags',
+        # Названия ингредиентов приходят через JOIN, а ключ включает
+        # свежую версию справочников: читаем их из основной базы
+        Prefetch(
+            'ingredients',
+            queryset=AmountIngredient.objects.using(
+                DEFAULT_DB_ALIAS).select_related('ingredient')
+        ),
+    )
+    return RecipeSerializer(
+        recipes,
+        many=True,
+        context={**context, 'relations': relations.EMPTY},
+    ).data
+
+
+def get_bodies(recipes, context):
+    """Представления рецептов без флагов пользователя.
+
+    Ключ включает время изменения рецепта и версию справочников, поэтому
+    изменённый рецепт просто получает новый ключ. Страница читается одним
+    get_many, недостающие рецепты собираются вместе и сохраняются
+    одним set_many.
+    """
+    prefix = _prefix(context['request'])
+    keys = [_key(prefix, recipe) for recipe in recipes]
+    bodies = cache.get_many(keys)
+    missing = [
+        (key, recipe) for key, recipe in zip(keys, recipes)
+        if key not in bodies
+    ]
+    if missing:
+        fresh = dict(zip(
+            [key for key, _ in missing],
+            _serialize([recipe for _, recipe in missing], context),
+        ))
+        cache.set_many(
+            fresh, getattr(settings, 'RECIPE_CACHE_TIMEOUT', 60 * 60 * 24))
+        bodies.update(fresh)
+    return [bodies[key] for key in keys]
+
+
+def get_representations(recipes, context):
+    """Представления рецептов из кэша с флагами текущего пользователя"""
+    user_relations = get_relations(context)
+    return [
+        {
+            **body,
+            'author': {
+                **body['author'],
+                'is_subscribed': (
+                    body['author']['id'] in user_relations.following),
+            },
+            'is_favorited': body['id'] in user_relations.favorites,
+            'is_in_shopping_cart': (
+                body['id'] in user_relations.shopping_cart),
+        }
+        for body in get_bodies(recipes, context)
+    ]
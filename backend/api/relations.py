@@ -0,0 +1,105 @@
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.module_loading import import_string
+
+from users.models import Subscription
+
+KEY = 'relations:{}'
+
+Relations = namedtuple(
+    'Relations', ['favorites', 'shopping_cart', 'following'])
+
+EMPTY = Relations(frozenset(), frozenset(), frozenset())
+
+
+class LocMemLRUBackend:
+    """Кэш в памяти процесса: ограниченный размер, вытеснение давно не
+    использованных записей и время жизни записи"""
+
+    def __init__(self, max_size=1024, timeout=300):
+        self.max_size = max_size
+        self.timeout = timeout
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            value, expires = item
+            if expires < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + self.timeout)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+
+class DjangoCacheBackend:
+    """Кэш Django, общий для всех процессов"""
+
+    def __init__(self, alias='default', timeout=300):
+        self.alias = alias
+        self.timeout = timeout
+
+    def get(self, key):
+        return caches[self.alias].get(key)
+
+    def set(self, key, value):
+        caches[self.alias].set(key, value, self.timeout)
+
+    def delete(self, key):
+        caches[self.alias].delete(key)
+
+
+@lru_cache(maxsize=None)
+def get_backend():
+    config = dict(getattr(settings, 'RELATIONS_CACHE', {}))
+    backend = import_string(config.pop(
+        'BACKEND', 'api.relations.DjangoCacheBackend'))
+    return backend(**config.get('OPTIONS', {}))
+
+
+def _load(user):
+    return Relations(
+        favorites=frozenset(
+            user.favorite.values_list('id', flat=True)),
+        shopping_cart=frozenset(
+            user.shopping_cart.values_list('id', flat=True)),
+        following=frozenset(
+            Subscription.objects.filter(user=user).values_list(
+                'author_id', flat=True)),
+    )
+
+
+def get_relations(user):
+    """Избранное, список покупок и подписки пользователя одним объектом"""
+    if not user.is_authenticated:
+        return EMPTY
+    key = KEY.format(user.pk)
+    relations = get_backend().get(key)
+    if relations is None:
+        relations = _load(user)
+        get_backend().set(key, relations)
+    return relations
+
+
+def invalidate(user_id):
+    """Сбрасывает кэш после изменения избранного, корзины или подписок"""
+    get_backend().delete(KEY.format(user_id))
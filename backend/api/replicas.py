@@ -0,0 +1,113 @@
+import random
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.utils.functional import SimpleLazyObject, empty
+from rest_framework.permissions import SAFE_METHODS
+
+KEY = 'replicas:primary:{}'
+
+# Модели, которые всегда читаются из основной базы: новый токен или сессия
+# должны работать сразу после входа, а справочники кэшируются по версии,
+# которая меняется сразу после записи, и данные отстающей реплики остались
+# бы в кэше под новой версией
+PRIMARY_MODELS = {
+    'authtoken.Token',
+    'sessions.Session',
+    'recipes.Tag',
+    'recipes.Ingredient',
+}
+
+_current = ContextVar('replica_state', default=None)
+
+
+def get_replicas():
+    return getattr(settings, 'REPLICA_DATABASES', [])
+
+
+def pin_to_primary(user_id):
+    """После записи пользователь читает из основной базы
+    REPLICA_STICKY_SECONDS секунд, пока реплики его догоняют"""
+    if get_replicas():
+        cache.set(
+            KEY.format(user_id),
+            True,
+            getattr(settings, 'REPLICA_STICKY_SECONDS', 10)
+        )
+
+
+def get_loaded_user(request):
+    """Пользователь запроса, если он уже определён. DRF сохраняет его в
+    request после аутентификации, ленивый пользователь сессии ещё не
+    загружен: его загрузка сама читает базу"""
+    user = getattr(request, 'user', None)
+    if isinstance(user, SimpleLazyObject) and user._wrapped is empty:
+        return None
+    return user
+
+
+class ReplicaState:
+    """Выбор базы для чтения в рамках одного запроса"""
+
+    def __init__(self, request):
+        self.request = request
+        self.replica = None
+        self.pinned = True if request.method not in SAFE_METHODS else None
+
+    def _is_pinned(self):
+        if self.pinned is None:
+            user = get_loaded_user(self.request)
+            if user is None:
+                return False
+            self.pinned = user.is_authenticated and cache.get(
+                KEY.format(user.pk), False)
+        return self.pinned
+
+    def get_read_alias(self):
+        if self._is_pinned():
+            return DEFAULT_DB_ALIAS
+        if self.replica is None:
+            self.replica = random.choice(get_replicas())
+        return self.replica
+
+
+def in_transaction():
+    """Внутри транзакции основной базы реплика может не видеть изменений"""
+    return connections[DEFAULT_DB_ALIAS].in_atomic_block
+
+
+def start_request(request):
+    return _current.set(ReplicaState(request))
+
+
+def finish_request(token):
+    _current.reset(token)
+
+
+class ReplicaRouter:
+    """Чтение в GET, HEAD и OPTIONS запросах - с одной из реплик
+    REPLICA_DATABASES, всё остальное - в основной базе.
+
+    Вне запроса (команды, фоновые задачи), внутри транзакции и после
+    недавней записи пользователя чтение тоже идёт из основной базы.
+    """
+
+    def db_for_read(self, model, **hints):
+        state = _current.get()
+        if (state is None or not get_replicas()
+                or model._meta.label in PRIMARY_MODELS
+                or in_transaction()):
+            return DEFAULT_DB_ALIAS
+        return state.get_read_alias()
+
+    def db_for_write(self, model, **hints):
+        """Явно, иначе Django пишет объект в базу, из которой он прочитан"""
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, **hints):
+        return db not in get_replicas()
@@ -1,12 +1,18 @@
 from django.contrib.auth.password_validation import validate_password
 from django.core import exceptions as django_exceptions
-from django.shortcuts import get_object_or_404
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.urls import reverse
 from djoser.serializers import UserCreateSerializer
 from drf_extra_fields.fields import Base64ImageField
 from rest_framework import serializers
 
-from api.utils import clear_ingredients_in_recipe, is_authenticated
-from recipes.models import AmountIngredient, Ingredient, Recipe, Tag
+from api import shopping_list
+from api.jobs import HANDLERS
+from api.utils import (clear_ingredients_in_recipe, get_recipes_limit,
+                       get_relations)
+from recipes.images import schedule_variants
+from recipes.models import AmountIngredient, Ingredient, Job, Recipe, Tag
 from users.models import User
 
 
@@ -41,6 +47,22 @@ class AddAmountIngredientSerializer(serializers.ModelSerializer):
         fields = ['id', 'amount']
 
 
+class ImageVariantsField(serializers.ReadOnlyField):
+    """Ссылки на уменьшенные копии фото рецепта по размерам и форматам"""
+
+    def to_representation(self, variants):
+        request = self.context.get('request')
+        result = {}
+        for variant, formats in variants.items():
+            result[variant] = {}
+            for extension, name in formats.items():
+                url = default_storage.url(name)
+                if request is not None:
+                    url = request.build_absolute_uri(url)
+                result[variant][extension] = url
+        return result
+
+
 class UserSerializer(serializers.ModelSerializer):
     is_subscribed = serializers.SerializerMethodField()
 
@@ -50,10 +72,7 @@ class UserSerializer(serializers.ModelSerializer):
                   'is_subscribed']
 
     def get_is_subscribed(self, obj):
-        if is_authenticated(self.context):
-            return obj.following.filter(
-                user=self.context['request'].user).exists()
-        return False
+        return obj.id in get_relations(self.context).following
 
 
 class UserCustomCreateSerializer(UserCreateSerializer):
@@ -84,26 +103,19 @@ class RecipeSerializer(serializers.ModelSerializer):
     ingredients = AmountIngredientsSerializer(read_only=True, many=True)
     is_favorited = serializers.SerializerMethodField()
     is_in_shopping_cart = serializers.SerializerMethodField()
+    image_variants = ImageVariantsField()
 
     class Meta:
         model = Recipe
         fields = ['id', 'tags', 'author', 'ingredients',
                   'is_favorited', 'is_in_shopping_cart', 'name', 'image',
-                  'text', 'cooking_time']
+                  'image_variants', 'text', 'cooking_time']
 
     def get_is_favorited(self, obj):
-        if is_authenticated(self.context):
-            return obj.favorite.filter(
-                id=self.context['request'].user.id
-            ).exists()
-        return False
+        return obj.id in get_relations(self.context).favorites
 
     def get_is_in_shopping_cart(self, obj):
-        if is_authenticated(self.context):
-            return obj.shopping_carts.filter(
-                id=self.context['request'].user.id
-            ).exists()
-        return False
+        return obj.id in get_relations(self.context).shopping_cart
 
 
 class AddRecipeSerializer(RecipeSerializer):
@@ -119,32 +131,31 @@ class AddRecipeSerializer(RecipeSerializer):
         fields = ['id', 'tags', 'ingredients', 'name', 'image', 'text',
                   'cooking_time']
 
+    def validate_ingredients(self, ingredients):
+        ids = [ingredient['ingredient']['id'] for ingredient in ingredients]
+        if len(set(ids)) != len(ids):
+            raise serializers.ValidationError(
+                'Есть повторяющиеся ингредиенты')
+
+        existing = set(Ingredient.objects.filter(
+            id__in=ids).values_list('id', flat=True))
+        for ingredient_id in ids:
+            if ingredient_id not in existing:
+                raise serializers.ValidationError(
+                    f'Недопустимый первичный ключ {ingredient_id} - объект '
+                    f'не существует')
+        return ingredients
+
     def validate(self, attrs):
         request = self.context['request']
         if request.method != 'POST':
             return attrs
 
-        check_id = []
-
         if int(attrs['cooking_time']) < 1:
             raise serializers.ValidationError(
                 {'cooking_time': ('Время готовки не может быть меньше или '
                                   'ровно 0')}
             )
-
-        for ingredient in attrs['ingredients']:
-            if ingredient['ingredient']['id'] in check_id:
-                raise serializers.ValidationError(
-                    {'ingredients': 'Есть повторяющиеся ингредиенты'})
-
-            check_id.append(ingredient['ingredient']['id'])
-
-            if not Ingredient.objects.filter(
-                    id=ingredient['ingredient']['id']).exists():
-                raise serializers.ValidationError(
-                    {'ingredients': f'Недопустимый первичный ключ '
-                                    f'{ingredient["id"]} - объект не '
-                                    f'существует'})
         return attrs
 
     def _take_validate_data(self, data):
@@ -153,17 +164,16 @@ class AddRecipeSerializer(RecipeSerializer):
         return tags, ingredients
 
     def _create_amount_for_recipe(self, ingredients, recipe):
-        for ingredient in ingredients:
-            add_ingredient = get_object_or_404(
-                Ingredient, pk=ingredient['ingredient']['id'])
-            amount, created = AmountIngredient.objects.get_or_create(
+        AmountIngredient.objects.bulk_create(
+            AmountIngredient(
                 recipe=recipe,
-                ingredient=add_ingredient,
-                amount=ingredient['amount']
+                ingredient_id=ingredient['ingredient']['id'],
+                amount=ingredient['amount'],
             )
-            if created:
-                amount.save()
+            for ingredient in ingredients
+        )
 
+    @transaction.atomic
     def create(self, validated_data):
         author = self.context['request'].user
         tags, ingredients = self._take_validate_data(validated_data)
@@ -174,47 +184,87 @@ class AddRecipeSerializer(RecipeSerializer):
         recipe.tags.set(tags)
 
         self._create_amount_for_recipe(ingredients, recipe)
+        schedule_variants(recipe)
         return recipe
 
+    @transaction.atomic
     def update(self, instance, validated_data):
+        old_ingredients = list(
+            instance.ingredients.values_list('ingredient_id', flat=True))
+        old_image = instance.image.name
         clear_ingredients_in_recipe(instance)
         tags, ingredients = self._take_validate_data(validated_data)
         super().update(instance, validated_data)
         self._create_amount_for_recipe(ingredients, instance)
+        # То же фото получает то же имя в хранилище, копии не нужны
+        if instance.image.name != old_image:
+            schedule_variants(instance)
         instance.tags.set(tags)
+        shopping_list.refresh(
+            instance.shopping_carts.values_list('id', flat=True),
+            old_ingredients + [
+                ingredient['ingredient']['id'] for ingredient in ingredients
+            ]
+        )
         return instance
 
     def to_representation(self, instance):
+        instance = Recipe.objects.with_related().get(pk=instance.pk)
         serializer = RecipeSerializer(instance, context=self.context)
         return serializer.data
 
 
 class SmallRecipeSerializer(serializers.ModelSerializer):
+    image_variants = ImageVariantsField()
+
     class Meta:
         model = Recipe
-        fields = ['id', 'name', 'image', 'cooking_time']
+        fields = ['id', 'name', 'image', 'image_variants', 'cooking_time']
+
+
+class RecipeIdsSerializer(serializers.Serializer):
+    """Список id рецептов для пакетного добавления и удаления"""
+    recipes = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=100,
+    )
 
 
 class UserRecipeSerializer(UserSerializer):
     recipes = serializers.SerializerMethodField()
-    recipes_count = serializers.SerializerMethodField()
 
     class Meta:
         model = User
         fields = ['email', 'id', 'username', 'first_name', 'last_name',
                   'is_subscribed', 'recipes', 'recipes_count']
 
-    def get_recipes_count(self, author):
-        return author.recipes.count()
-
     def get_recipes(self, author):
-        request = self.context.get('request')
-        recipes_limit = request.GET.get('recipes_limit')
-        if recipes_limit is not None and int(recipes_limit) > 0:
-            queryset = Recipe.objects.filter(
-                author=author
-            )[:int(recipes_limit)]
-        else:
-            queryset = Recipe.objects.filter(author=author)
+        if hasattr(author, 'recent_recipes'):
+            return SmallRecipeSerializer(
+                author.recent_recipes, many=True, read_only=True).data
+
+        recipes_limit = get_recipes_limit(self.context['request'])
+        queryset = Recipe.objects.filter(author=author)
+        if recipes_limit:
+            queryset = queryset[:recipes_limit]
 
         return SmallRecipeSerializer(queryset, many=True, read_only=True).data
+
+
+class JobSerializer(serializers.ModelSerializer):
+    kind = serializers.ChoiceField(choices=list(HANDLERS))
+    result = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Job
+        fields = ['id', 'kind', 'status', 'error', 'created', 'finished',
+                  'result']
+        read_only_fields = ['status', 'error', 'created', 'finished']
+
+    def get_result(self, job):
+        """Адрес файла, когда задача выполнена"""
+        if job.status != Job.Status.DONE:
+            return None
+        return self.context['request'].build_absolute_uri(
+            reverse('jobs-result', args=[job.pk]))
@@ -0,0 +1,190 @@
+import hashlib
+import io
+import json
+import os
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F, Sum
+from reportlab.lib.pagesizes import A4
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.pdfgen import canvas
+
+from recipes.models import AmountIngredient, Ingredient, ShoppingListItem
+from users.models import User
+
+FONT_NAME = 'Arkhip'
+FONT_PATH = os.path.join(settings.BASE_DIR, 'fonts', 'arkhip_font.ttf')
+
+TITLE = 'Список покупок'
+FILENAME = f'{TITLE}.pdf'
+TITLE_SIZE = 32
+LINE_SIZE = 18
+LINE_STEP = 30
+MARGIN_LEFT = 55
+MARGIN_TOP = 42
+MARGIN_BOTTOM = 50
+
+CACHE_TIMEOUT = 60 * 60 * 24
+DIGEST_KEY = 'shopping_list:digest:{}'
+PDF_KEY = 'shopping_list:pdf:{}'
+
+
+@lru_cache(maxsize=None)
+def register_font():
+    """Регистрирует шрифт один раз на процесс"""
+    pdfmetrics.registerFont(TTFont(FONT_NAME, FONT_PATH, 'UTF-8'))
+    return FONT_NAME
+
+
+def get_shopping_list(user):
+    """Список покупок пользователя из предрассчитанной таблицы"""
+    return list(ShoppingListItem.objects.filter(user=user).values(
+        name=F('ingredient__name'),
+        measurement_unit=F('ingredient__measurement_unit'),
+        count=F('amount'),
+    ).order_by('name', 'measurement_unit'))
+
+
+def get_live_shopping_list(user):
+    """Суммарное количество ингредиентов по рецептам из списка покупок"""
+    return list(Ingredient.objects.filter(
+        ingredient_count__recipe__in=user.shopping_cart.all()
+    ).values('name', 'measurement_unit').annotate(
+        count=Sum('ingredient_count__amount')
+    ).order_by('name', 'measurement_unit'))
+
+
+def _aggregate(amounts):
+    rows = amounts.values('recipe__shopping_carts', 'ingredient').annotate(
+        total=Sum('amount')).order_by()
+    return [
+        ShoppingListItem(
+            user_id=row['recipe__shopping_carts'],
+            ingredient_id=row['ingredient'],
+            amount=row['total'],
+        )
+        for row in rows
+    ]
+
+
+def refresh(user_ids, ingredient_ids):
+    """Пересчитывает у пользователей строки списка покупок с указанными
+    ингредиентами. Пользователи блокируются в порядке id, чтобы параллельные
+    пересчёты одних и тех же списков шли по очереди"""
+    user_ids = sorted(set(user_ids))
+    ingredient_ids = list(ingredient_ids)
+    if not user_ids or not ingredient_ids:
+        return
+    with transaction.atomic():
+        list(User.objects.select_for_update().filter(
+            pk__in=user_ids).order_by('pk').values_list('pk', flat=True))
+        ShoppingListItem.objects.filter(
+            user_id__in=user_ids, ingredient_id__in=ingredient_ids
+        ).delete()
+        ShoppingListItem.objects.bulk_create(_aggregate(
+            AmountIngredient.objects.filter(
+                recipe__shopping_carts__in=user_ids,
+                ingredient_id__in=ingredient_ids,
+            )
+        ))
+        # Иначе параллельный запрос успеет закэшировать PDF по старым
+        # строкам, пока внешняя транзакция не зафиксирована
+        transaction.on_commit(lambda: invalidate(user_ids))
+
+
+def rebuild():
+    """Полностью пересобирает списки покупок всех пользователей"""
+    with transaction.atomic():
+        user_ids = set(ShoppingListItem.objects.values_list(
+            'user_id', flat=True).distinct())
+        ShoppingListItem.objects.all().delete()
+        items = ShoppingListItem.objects.bulk_create(_aggregate(
+            AmountIngredient.objects.filter(
+                recipe__shopping_carts__isnull=False)
+        ))
+        user_ids |= {item.user_id for item in items}
+        transaction.on_commit(lambda: invalidate(user_ids))
+    return len(items)
+
+
+def get_digest(items):
+    """Хэш списка покупок, под которым хранится готовый PDF"""
+    payload = json.dumps(items, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def render_pdf(items):
+    """Рисует список покупок, перенося строки на новые страницы"""
+    font = register_font()
+    width, height = A4
+    buffer = io.BytesIO()
+
+    page = canvas.Canvas(buffer, pagesize=A4)
+    page.setFont(font, size=TITLE_SIZE)
+    page.drawCentredString(width / 2, height - MARGIN_TOP, TITLE)
+    page.setFont(font, size=LINE_SIZE)
+    position = height - MARGIN_TOP - TITLE_SIZE - LINE_STEP
+
+    for i, ingredient in enumerate(items, 1):
+        if position < MARGIN_BOTTOM:
+            page.showPage()
+            page.setFont(font, size=LINE_SIZE)
+            position = height - MARGIN_TOP
+        page.drawString(
+            MARGIN_LEFT,
+            position,
+            f'{i}. {ingredient["name"]}: {ingredient["count"]} '
+            f'{ingredient["measurement_unit"]}'
+        )
+        position -= LINE_STEP
+
+    page.showPage()
+    page.save()
+    return buffer.getvalue()
+
+
+def get_cached_pdf(user):
+    """PDF из кэша, пока корзина не менялась, без запроса к базе"""
+    digest = cache.get(DIGEST_KEY.format(user.id))
+    if digest is None:
+        return None
+    return cache.get(PDF_KEY.format(digest))
+
+
+def is_large(user):
+    """Список длиннее SHOPPING_LIST_SYNC_LIMIT позиций рисуется в фоне"""
+    return ShoppingListItem.objects.filter(user=user).count() > getattr(
+        settings, 'SHOPPING_LIST_SYNC_LIMIT', 50)
+
+
+def get_pdf(user):
+    """Возвращает PDF списка покупок пользователя.
+
+    Пока корзина не меняется, PDF берётся из кэша без запроса к базе.
+    """
+    pdf = get_cached_pdf(user)
+    if pdf is not None:
+        return pdf
+
+    items = get_shopping_list(user)
+    digest = get_digest(items)
+    pdf = cache.get(PDF_KEY.format(digest))
+    if pdf is None:
+        pdf = render_pdf(items)
+        cache.set(PDF_KEY.format(digest), pdf, CACHE_TIMEOUT)
+    cache.set(DIGEST_KEY.format(user.id), digest, CACHE_TIMEOUT)
+    return pdf
+
+
+def export_pdf(job):
+    """Обработчик фоновой задачи shopping_list_pdf"""
+    return FILENAME, get_pdf(job.user)
+
+
+def invalidate(user_ids):
+    """Сбрасывает кэш списка покупок у пользователей"""
+    cache.delete_many([DIGEST_KEY.format(user_id) for user_id in user_ids])
@@ -0,0 +1,176 @@
+from django.db import transaction
+from django.db.backends.signals import connection_created
+from django.db.models.signals import (m2m_changed, post_delete, post_save,
+                                      pre_delete)
+from django.dispatch import receiver
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+
+from api import catalogue, counters, metrics, shopping_list, timeline
+from api.authentication import invalidate_tokens
+from recipes import search
+from recipes.models import AmountIngredient, Ingredient, Recipe, Tag
+from users.models import Subscription, User
+
+AUTHOR_FIELDS = {'email', 'username', 'first_name', 'last_name'}
+
+
+@receiver([post_save, post_delete], sender=Tag)
+@receiver([post_save, post_delete], sender=Ingredient)
+def catalogue_changed(**kwargs):
+    """Новая версия справочников при изменении тэгов и ингредиентов.
+    Версия меняется после фиксации, иначе под новой версией закэшируется
+    ответ со старыми данными"""
+    transaction.on_commit(catalogue.bump)
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_created(instance, created, **kwargs):
+    if created:
+        counters.change(User, [instance.author_id], 'recipes_count', 1)
+
+
+@receiver(pre_delete, sender=Recipe)
+def recipe_deleting(instance, **kwargs):
+    """Связи с корзинами и ингредиенты удаляются каскадом, поэтому для
+    пересчёта списков покупок они запоминаются до удаления"""
+    instance._shopping_list = (
+        list(instance.shopping_carts.values_list('id', flat=True)),
+        list(instance.ingredients.values_list('ingredient_id', flat=True)),
+    )
+
+
+@receiver(post_delete, sender=Recipe)
+def recipe_deleted(instance, **kwargs):
+    counters.change(User, [instance.author_id], 'recipes_count', -1)
+    shopping_list.refresh(*instance.__dict__.pop('_shopping_list', ([], [])))
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_search_saved(instance, update_fields, **kwargs):
+    """Поисковый индекс обновляется, если могли измениться название или
+    описание"""
+    if update_fields is None or {'name', 'text'} & set(update_fields):
+        search.update_index([instance.pk])
+
+
+@receiver(post_delete, sender=Recipe)
+def recipe_search_deleted(instance, **kwargs):
+    search.remove_from_index([instance.pk])
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_published(instance, created, **kwargs):
+    if created:
+        timeline.publish(instance)
+
+
+@receiver(post_save, sender=Subscription)
+def subscription_created(instance, created, **kwargs):
+    if created:
+        counters.change(User, [instance.author_id], 'followers_count', 1)
+        timeline.backfill(instance.user_id, instance.author_id)
+
+
+@receiver(post_delete, sender=Subscription)
+def subscription_deleted(instance, **kwargs):
+    counters.change(User, [instance.author_id], 'followers_count', -1)
+    timeline.remove(instance.user_id, instance.author_id)
+
+
+def _changed_links(through, instance, action, reverse, pk_set):
+    """id другой стороны изменённых связей рецептов с пользователями: id
+    рецептов, если менялись связи пользователя, иначе id пользователей.
+
+    add() передаёт в pk_set только новые связи, а для remove() и clear()
+    удаляемые связи запоминаются до удаления. Для остальных действий
+    возвращает None.
+    """
+    if action in ('pre_remove', 'pre_clear'):
+        links = through.objects.filter(
+            **{'user' if reverse else 'recipe': instance})
+        if action == 'pre_remove':
+            links = links.filter(
+                **{'recipe__in' if reverse else 'user__in': pk_set})
+        instance.__dict__.setdefault('_removed_links', {})[through] = list(
+            links.values_list('recipe_id' if reverse else 'user_id',
+                              flat=True))
+        return None
+    if action == 'post_add':
+        return list(pk_set)
+    if action in ('post_remove', 'post_clear'):
+        return instance.__dict__.get('_removed_links', {}).pop(through, [])
+    return None
+
+
+@receiver(m2m_changed, sender=Recipe.favorite.through)
+def favorites_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    """Счётчики избранного при изменении связей через add(), remove() и
+    clear()"""
+    changed = _changed_links(sender, instance, action, reverse, pk_set)
+    if not changed:
+        return
+    delta = 1 if action == 'post_add' else -1
+    if reverse:
+        counters.change(Recipe, changed, 'favorites_count', delta)
+    else:
+        counters.change(
+            Recipe, [instance.pk], 'favorites_count', delta * len(changed))
+
+
+@receiver(m2m_changed, sender=Recipe.shopping_carts.through)
+def shopping_carts_changed(sender, instance, action, reverse, pk_set,
+                           **kwargs):
+    """Корзина, изменённая мимо API, например в админке, пересчитывает
+    список покупок"""
+    changed = _changed_links(sender, instance, action, reverse, pk_set)
+    if not changed:
+        return
+    user_ids, recipe_ids = (
+        ([instance.pk], changed) if reverse else (changed, [instance.pk]))
+    shopping_list.refresh(
+        user_ids,
+        AmountIngredient.objects.filter(
+            recipe__in=recipe_ids).values_list('ingredient_id', flat=True)
+    )
+
+
+@receiver(pre_delete, sender=User)
+def user_deleted(instance, **kwargs):
+    """Связи избранного удаляются каскадом без сигналов m2m_changed"""
+    counters.change(
+        Recipe,
+        list(instance.favorite.values_list('id', flat=True)),
+        'favorites_count',
+        -1
+    )
+
+
+@receiver(post_delete, sender=Token)
+def token_deleted(instance, **kwargs):
+    """Выход через djoser удаляет токен - убираем его и из кэша"""
+    invalidate_tokens([instance.key])
+
+
+@receiver(post_save, sender=User)
+def user_changed(instance, **kwargs):
+    """Деактивация или другие изменения пользователя сбрасывают кэш его
+    токенов"""
+    invalidate_tokens(Token.objects.filter(
+        user=instance).values_list('key', flat=True))
+
+
+@receiver(post_save, sender=User)
+def author_profile_changed(instance, created, update_fields, **kwargs):
+    """Автор входит в представление рецепта: его рецепты получают новую
+    версию в кэше. Вход в систему (last_login) их не трогает"""
+    if created or (update_fields is not None and not (
+            AUTHOR_FIELDS & set(update_fields))):
+        return
+    Recipe.objects.filter(author=instance).update(updated=timezone.now())
+
+
+@receiver(connection_created)
+def connection_opened(connection, **kwargs):
+    """Запросы каждого соединения попадают в метрики запроса"""
+    metrics.install(connection)
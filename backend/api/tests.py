@@ -0,0 +1,864 @@
+import io
+import os
+import re
+import shutil
+import tempfile
+import time
+from asyncio import iscoroutinefunction
+from unittest import mock, skipUnless
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.http import HttpResponse
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.authtoken.models import Token
+from rest_framework.request import Request
+from rest_framework.test import APIClient, APIRequestFactory
+
+from api import (authentication, catalogue, counters, jobs, metrics,
+                 recipe_cache, relations, replicas, shopping_list, timeline)
+from api.async_views import async_patterns
+from api.filters import RecipeFilterBackend
+from api.ingredient_search import MAX_RESULTS, IngredientIndex
+from api.middleware import ReplicaMiddleware, RequestMetricsMiddleware
+from api.urls import router
+from recipes.models import (AmountIngredient, Ingredient, Job, PopularAuthor,
+                            Recipe, Tag, TimelineEntry)
+from users.models import Subscription, User
+
+LOCMEM_CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+}
+
+
+def create_recipes(author, tags, ingredients, count):
+    recipes = []
+    for number in range(count):
+        recipe = Recipe.objects.create(
+            author=author,
+            name=f'Рецепт {number}',
+            text='Описание',
+            cooking_time=10,
+            image='recipes/images/test.png',
+        )
+        recipe.tags.set(tags)
+        AmountIngredient.objects.bulk_create(
+            AmountIngredient(recipe=recipe, ingredient=ingredient, amount=1)
+            for ingredient in ingredients
+        )
+        recipes.append(recipe)
+    return recipes
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class FoodgramTestCase(TestCase):
+    """Пользователи, справочники и рецепты двух авторов"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            'user@example.com', 'user', 'password')
+        cls.authors = [
+            User.objects.create_user(
+                f'author{number}@example.com', f'author{number}', 'password')
+            for number in range(2)
+        ]
+        cls.tags = [
+            Tag.objects.create(
+                name=f'Тэг {number}', color=f'#00000{number}',
+                slug=f'tag{number}')
+            for number in range(3)
+        ]
+        cls.ingredients = [
+            Ingredient.objects.create(
+                name=f'Ингредиент {number}', measurement_unit='г')
+            for number in range(3)
+        ]
+        cls.recipes = []
+        for author in cls.authors:
+            cls.recipes += create_recipes(
+                author, cls.tags, cls.ingredients, 8)
+        Subscription.objects.create(user=cls.user, author=cls.authors[0])
+        cls.user.favorite.add(*cls.recipes[:4])
+        cls.user.shopping_cart.add(*cls.recipes[2:6])
+
+    def setUp(self):
+        cache.clear()
+        self.anonymous = APIClient()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+
+class RecipeQueryCountTest(FoodgramTestCase):
+    """Число запросов к базе не зависит от размера страницы"""
+
+    def assert_queries(self, client, path, count):
+        with self.assertNumQueries(count):
+            response = client.get(path)
+        self.assertEqual(response.status_code, 200)
+
+    def test_list(self):
+        for limit in (3, 10):
+            path = f'/api/recipes/?limit={limit}'
+            with self.subTest(limit=limit):
+                cache.clear()
+                # Количество, страница, авторы, тэги и ингредиенты
+                self.assert_queries(self.anonymous, path, 5)
+                # Тела рецептов уже в кэше: количество, страница, избранное,
+                # корзина и подписки
+                self.assert_queries(self.client, path, 5)
+                self.assert_queries(self.client, path, 2)
+
+    def test_retrieve(self):
+        path = f'/api/recipes/{self.recipes[0].pk}/'
+        self.assert_queries(self.anonymous, path, 4)
+        self.assert_queries(self.client, path, 4)
+        self.assert_queries(self.client, path, 1)
+
+
+class ShoppingListCacheTest(FoodgramTestCase):
+    """Кэш PDF сбрасывается только после фиксации транзакции"""
+
+    def test_invalidate_on_commit(self):
+        key = shopping_list.DIGEST_KEY.format(self.user.pk)
+        shopping_list.get_pdf(self.user)
+        self.assertIsNotNone(cache.get(key))
+        recipe = self.recipes[-1]
+        with self.captureOnCommitCallbacks() as callbacks:
+            response = self.client.post(
+                f'/api/recipes/{recipe.pk}/shopping_cart/')
+            self.assertEqual(response.status_code, 201)
+            self.assertIsNotNone(cache.get(key))
+        for callback in callbacks:
+            callback()
+        self.assertIsNone(cache.get(key))
+
+
+class ShoppingListSignalsTest(FoodgramTestCase):
+    """Список покупок пересчитывается при изменениях корзины мимо API"""
+
+    def counts(self, user):
+        items = shopping_list.get_shopping_list(user)
+        self.assertEqual(items, shopping_list.get_live_shopping_list(user))
+        return {item['count'] for item in items}
+
+    def test_cart_changed_directly(self):
+        author = self.authors[1]
+        recipe = self.recipes[0]
+        recipe.shopping_carts.add(author)
+        self.assertEqual(self.counts(author), {1})
+        author.shopping_cart.add(*self.recipes[1:3])
+        self.assertEqual(self.counts(author), {3})
+        author.shopping_cart.remove(self.recipes[1])
+        self.assertEqual(self.counts(author), {2})
+        recipe.shopping_carts.clear()
+        self.assertEqual(self.counts(author), {1})
+        self.assertEqual(self.counts(self.user), {4})
+        author.shopping_cart.clear()
+        self.assertEqual(self.counts(author), set())
+
+    def test_recipe_deleted(self):
+        Recipe.objects.filter(pk=self.recipes[2].pk).delete()
+        self.assertEqual(self.counts(self.user), {3})
+        self.authors[0].delete()
+        self.assertEqual(self.counts(self.user), set())
+
+
+class CatalogueVersionTest(FoodgramTestCase):
+    """Версия справочников меняется после фиксации транзакции"""
+
+    def test_bump_on_commit(self):
+        version = catalogue.get_version()
+        with self.captureOnCommitCallbacks(execute=True):
+            Tag.objects.create(name='Новый', color='#FFFFFF', slug='new')
+            self.assertEqual(catalogue.get_version(), version)
+        self.assertGreater(catalogue.get_version(), version)
+
+
+class SubscriptionsTest(FoodgramTestCase):
+    """Подписки с ограничением числа рецептов"""
+
+    def test_recipes_limit(self):
+        response = self.client.get(
+            '/api/users/subscriptions/?recipes_limit=3')
+        self.assertEqual(response.status_code, 200)
+        [author] = response.data['results']
+        self.assertEqual(author['id'], self.authors[0].pk)
+        self.assertEqual(len(author['recipes']), 3)
+
+    def test_invalid_recipes_limit(self):
+        for recipes_limit in ('abc', '-1', ''):
+            with self.subTest(recipes_limit=recipes_limit):
+                response = self.client.get(
+                    '/api/users/subscriptions/',
+                    {'recipes_limit': recipes_limit})
+                self.assertEqual(response.status_code, 200)
+                [author] = response.data['results']
+                self.assertEqual(len(author['recipes']), 8)
+        response = self.client.post(
+            f'/api/users/{self.authors[1].pk}/subscribe/?recipes_limit=abc')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(response.data['recipes']), 8)
+
+    def test_recipes_limit_without_subscriptions(self):
+        self.client.force_authenticate(self.authors[1])
+        response = self.client.get(
+            '/api/users/subscriptions/?recipes_limit=3')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['results'], [])
+
+    def test_latest_per_author_empty(self):
+        self.assertQuerysetEqual(
+            Recipe.objects.filter(author__in=[]).latest_per_author(3), [])
+
+
+@skipUnless(connection.vendor == 'sqlite', 'План разбирается в формате SQLite')
+class RecipeFilterPlanTest(FoodgramTestCase):
+    """Фильтры читают таблицы связей по индексам и без DISTINCT"""
+
+    JOIN_TABLES = (
+        'recipes_recipe_tags',
+        'recipes_recipe_favorite',
+        'recipes_recipe_shopping_carts',
+    )
+
+    def test_filtered_list(self):
+        request = Request(APIRequestFactory().get('/api/recipes/', {
+            'tags': ['tag0', 'tag1'],
+            'is_favorited': '1',
+            'is_in_shopping_cart': '1',
+        }))
+        request.user = self.user
+        queryset = RecipeFilterBackend().filter_queryset(
+            request, Recipe.objects.all(), None)
+        self.assertNotIn('DISTINCT', str(queryset.query).upper())
+        plan = queryset.explain()
+        # В плане таблицы связей под псевдонимами, а индексы названы
+        # по таблице: уникальные из схемы и добавленные в 0006
+        indexes = re.findall(
+            r'SEARCH \w+ USING (?:COVERING )?INDEX (\w+)', plan)
+        for table in self.JOIN_TABLES:
+            with self.subTest(table=table):
+                self.assertTrue(
+                    any(index.startswith(table) for index in indexes), plan)
+        self.assertNotRegex(plan, r'SCAN (?!recipes_recipe USING)')
+
+
+class AsyncReadPathTest(FoodgramTestCase):
+    """Асинхронные view только для чтения и middleware без потоков"""
+
+    @override_settings(ASYNC_VIEWS=True)
+    def test_only_reads_are_async(self):
+        patterns = {
+            pattern.name: pattern.callback
+            for pattern in async_patterns(router.urls)
+        }
+        self.assertTrue(iscoroutinefunction(patterns['recipe-list']))
+        self.assertTrue(iscoroutinefunction(patterns['recipe-detail']))
+        self.assertFalse(iscoroutinefunction(patterns['recipe-feed']))
+        self.assertFalse(iscoroutinefunction(patterns['jobs-result']))
+
+    def test_async_capable_middleware(self):
+        async def get_response(request):
+            return HttpResponse()
+
+        for middleware in (RequestMetricsMiddleware, ReplicaMiddleware):
+            with self.subTest(middleware=middleware.__name__):
+                self.assertTrue(
+                    iscoroutinefunction(middleware(get_response)))
+                self.assertFalse(
+                    iscoroutinefunction(middleware(lambda request: None)))
+
+    async def test_asgi_request(self):
+        response = await self.async_client.get('/api/tags/')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('total;dur=', response['Server-Timing'])
+
+
+class MetricsViewTest(FoodgramTestCase):
+    """/api/metrics/ закрыт без METRICS_TOKEN и с неверным токеном"""
+
+    @override_settings(METRICS_TOKEN='')
+    def test_without_token(self):
+        response = self.anonymous.get(
+            '/api/metrics/', HTTP_AUTHORIZATION='Bearer ')
+        self.assertEqual(response.status_code, 403)
+
+    @override_settings(METRICS_TOKEN='secret')
+    def test_with_token(self):
+        response = self.anonymous.get(
+            '/api/metrics/', HTTP_AUTHORIZATION='Bearer wrong')
+        self.assertEqual(response.status_code, 403)
+        response = self.anonymous.get(
+            '/api/metrics/', HTTP_AUTHORIZATION='Bearer secret')
+        self.assertEqual(response.status_code, 200)
+
+    def test_pooler_gauges(self):
+        text = metrics.render({
+            'foodgram_db_pooler_waiting_clients': {'db': [3]},
+            'foodgram_db_pooler_max_wait_seconds': {'db': [0.25]},
+        })
+        self.assertIn(
+            '# TYPE foodgram_db_pooler_waiting_clients gauge', text)
+        self.assertIn(
+            'foodgram_db_pooler_waiting_clients{database="db"} 3', text)
+        self.assertIn(
+            'foodgram_db_pooler_max_wait_seconds{database="db"} 0.25', text)
+
+
+@override_settings(REPLICA_DATABASES=['replica_1'], REPLICA_STICKY_SECONDS=0.5)
+class ReplicaRoutingTest(FoodgramTestCase):
+    """Чтение с реплики и закрепление за основной базой после записи.
+
+    База replica_1 в тестах пустая, поэтому ответ показывает, откуда
+    прочитаны данные.
+    """
+
+    databases = {'default', 'replica_1'}
+
+    def setUp(self):
+        super().setUp()
+        # TestCase выполняет каждый тест в транзакции, а внутри транзакции
+        # роутер читает из основной базы
+        patcher = mock.patch('api.replicas.in_transaction', return_value=False)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def subscriptions(self):
+        response = self.client.get('/api/users/subscriptions/')
+        self.assertEqual(response.status_code, 200)
+        return [author['id'] for author in response.data['results']]
+
+    def test_read_your_writes(self):
+        self.assertEqual(self.subscriptions(), [])
+        response = self.client.post(
+            f'/api/users/{self.authors[1].pk}/subscribe/')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(
+            self.subscriptions(), [author.pk for author in self.authors])
+        time.sleep(0.6)
+        self.assertEqual(self.subscriptions(), [])
+
+    def test_catalogue_from_primary(self):
+        catalogue.bump()
+        response = self.anonymous.get('/api/tags/')
+        self.assertEqual(
+            [tag['slug'] for tag in response.data],
+            [tag.slug for tag in self.tags])
+        response = self.anonymous.get('/api/ingredients/?name=ингредиент')
+        self.assertEqual(len(response.data), len(self.ingredients))
+
+    def test_recipe_body_ingredients_from_primary(self):
+        token = replicas.start_request(
+            APIRequestFactory().get('/api/recipes/'))
+        self.addCleanup(replicas.finish_request, token)
+        ingredients = recipe_cache._serialize(
+            [self.recipes[0]], {'request': None})[0]['ingredients']
+        self.assertEqual(len(ingredients), len(self.ingredients))
+
+
+class BatchRelationsTest(FoodgramTestCase):
+    """Пакетное добавление и удаление избранного и корзины"""
+
+    def statuses(self, response):
+        self.assertEqual(response.status_code, 200)
+        return {
+            item['id']: item['status'] for item in response.data['results']}
+
+    def test_favorite(self):
+        added, new = self.recipes[0], self.recipes[10]
+        missing = Recipe.objects.count() + 1000
+        ids = [added.pk, new.pk, missing]
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                '/api/recipes/favorite/', {'recipes': ids}, format='json')
+        self.assertEqual(self.statuses(response), {
+            added.pk: 'already_added', new.pk: 'added', missing: 'not_found'})
+        new.refresh_from_db()
+        self.assertEqual(new.favorites_count, 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.delete(
+                '/api/recipes/favorite/', {'recipes': ids}, format='json')
+        self.assertEqual(self.statuses(response), {
+            added.pk: 'removed', new.pk: 'removed', missing: 'not_found'})
+        new.refresh_from_db()
+        self.assertEqual(new.favorites_count, 0)
+        self.assertFalse(self.user.favorite.filter(pk=added.pk).exists())
+
+    def test_shopping_cart(self):
+        recipes = self.recipes[10:13]
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                '/api/recipes/shopping_cart/',
+                {'recipes': [recipe.pk for recipe in recipes]},
+                format='json',
+            )
+        self.assertEqual(
+            set(self.statuses(response).values()), {'added'})
+        # По одному каждого ингредиента в 4 рецептах корзины и 3 новых
+        self.assertEqual(
+            [item['count'] for item in shopping_list.get_shopping_list(
+                self.user)],
+            [7] * len(self.ingredients),
+        )
+
+
+@override_settings(
+    MEDIA_ROOT=os.path.join(tempfile.gettempdir(), 'foodgram_test_jobs'),
+    SHOPPING_LIST_SYNC_LIMIT=2,
+)
+class JobQueueTest(FoodgramTestCase):
+    """Большой список покупок рисуется фоновой задачей"""
+
+    def setUp(self):
+        super().setUp()
+        self.addCleanup(
+            shutil.rmtree, settings.MEDIA_ROOT, ignore_errors=True)
+
+    def test_small_list_is_sync(self):
+        with self.settings(SHOPPING_LIST_SYNC_LIMIT=50):
+            response = self.client.get('/api/recipes/download_shopping_cart/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+
+    def test_large_list_is_job(self):
+        response = self.client.get('/api/recipes/download_shopping_cart/')
+        self.assertEqual(response.status_code, 202)
+        job_id = response.data['id']
+        self.assertEqual(
+            self.client.get('/api/recipes/download_shopping_cart/')
+            .data['id'],
+            job_id,
+        )
+        self.assertEqual(
+            self.client.get(f'/api/jobs/{job_id}/result/').status_code, 409)
+
+        self.assertEqual(jobs.work(once=True), 1)
+        response = self.client.get(f'/api/jobs/{job_id}/')
+        self.assertEqual(response.data['status'], Job.Status.DONE)
+        response = self.client.get(f'/api/jobs/{job_id}/result/')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(b''.join(response.streaming_content).startswith(
+            b'%PDF'))
+
+    def test_foreign_job(self):
+        job = jobs.enqueue(self.authors[0], 'shopping_list_pdf')
+        response = self.client.get(f'/api/jobs/{job.pk}/')
+        self.assertEqual(response.status_code, 404)
+
+
+class CountersTest(FoodgramTestCase):
+    """Счётчики избранного, рецептов и подписчиков"""
+
+    def test_counters(self):
+        recipe = self.recipes[0]
+        author = self.authors[0]
+        self.assertEqual(
+            Recipe.objects.get(pk=recipe.pk).favorites_count, 1)
+        author.refresh_from_db()
+        self.assertEqual(author.recipes_count, 8)
+        self.assertEqual(author.followers_count, 1)
+
+        self.client.delete(f'/api/recipes/{recipe.pk}/favorite/')
+        self.assertEqual(
+            Recipe.objects.get(pk=recipe.pk).favorites_count, 0)
+        self.client.delete(f'/api/users/{author.pk}/subscribe/')
+        recipe.delete()
+        author.refresh_from_db()
+        self.assertEqual(author.recipes_count, 7)
+        self.assertEqual(author.followers_count, 0)
+
+    def test_reconcile(self):
+        User.objects.filter(pk=self.authors[1].pk).update(
+            recipes_count=0, followers_count=5)
+        Recipe.objects.filter(pk=self.recipes[1].pk).update(
+            favorites_count=10)
+        self.assertEqual(counters.reconcile(), {
+            'Recipe.favorites_count': 1,
+            'User.recipes_count': 1,
+            'User.followers_count': 1,
+        })
+        author = User.objects.get(pk=self.authors[1].pk)
+        self.assertEqual(
+            (author.recipes_count, author.followers_count), (8, 0))
+        self.assertEqual(
+            Recipe.objects.get(pk=self.recipes[1].pk).favorites_count, 1)
+        self.assertEqual(set(counters.reconcile().values()), {0})
+
+
+class RelationsCacheTest(FoodgramTestCase):
+    """Кэш избранного, корзины и подписок пользователя"""
+
+    def recipe(self, recipe):
+        return self.client.get(f'/api/recipes/{recipe.pk}/').data
+
+    def test_flags_follow_changes(self):
+        recipe = self.recipes[12]
+        data = self.recipe(recipe)
+        self.assertFalse(data['is_favorited'])
+        self.assertFalse(data['is_in_shopping_cart'])
+        self.assertFalse(data['author']['is_subscribed'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(f'/api/recipes/{recipe.pk}/favorite/')
+            self.client.post(f'/api/recipes/{recipe.pk}/shopping_cart/')
+            self.client.post(f'/api/users/{recipe.author_id}/subscribe/')
+        data = self.recipe(recipe)
+        self.assertTrue(data['is_favorited'])
+        self.assertTrue(data['is_in_shopping_cart'])
+        self.assertTrue(data['author']['is_subscribed'])
+
+    def test_lru_backend(self):
+        backend = relations.LocMemLRUBackend(max_size=2, timeout=0.1)
+        backend.set('a', 1)
+        backend.set('b', 2)
+        self.assertEqual(backend.get('a'), 1)
+        backend.set('c', 3)
+        self.assertIsNone(backend.get('b'))
+        self.assertEqual(backend.get('a'), 1)
+        time.sleep(0.15)
+        self.assertIsNone(backend.get('c'))
+
+
+class CachedTokenAuthenticationTest(FoodgramTestCase):
+    """Токен проверяется по кэшу и сбрасывается при выходе и
+    деактивации"""
+
+    def setUp(self):
+        super().setUp()
+        self.token = Token.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.credentials(
+            HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def me(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/users/me/')
+        tables = ' '.join(query['sql'] for query in queries)
+        return response.status_code, 'authtoken_token' in tables
+
+    def test_cached(self):
+        self.assertEqual(self.me(), (200, True))
+        self.assertEqual(self.me(), (200, False))
+
+    def test_logout(self):
+        self.me()
+        response = self.client.post('/api/auth/token/logout/')
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(self.me()[0], 401)
+
+    def test_deactivated(self):
+        self.me()
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.me()[0], 401)
+
+    def test_password_not_cached(self):
+        self.me()
+        cached = cache.get(authentication._cache_key(self.token.key))
+        self.assertNotIn(self.user.password, repr(cached))
+        response = self.client.post('/api/users/set_password/', {
+            'current_password': 'password',
+            'new_password': 'N3w-secret-password',
+        })
+        self.assertEqual(response.status_code, 204)
+        user = User.objects.get(pk=self.user.pk)
+        self.assertTrue(user.check_password('N3w-secret-password'))
+        self.assertEqual(user.username, self.user.username)
+
+    def test_benchmark_keeps_default_cache(self):
+        cache.set('kept', 1)
+        call_command('bench_authentication', repeat=1, stdout=io.StringIO())
+        self.assertEqual(cache.get('kept'), 1)
+        self.assertFalse(User.objects.filter(
+            email='bench-auth@example.com').exists())
+
+
+class RecipeCacheTest(FoodgramTestCase):
+    """Кэшированное представление рецепта обновляется после изменений"""
+
+    def setUp(self):
+        super().setUp()
+        self.recipe = Recipe.objects.get(pk=self.recipes[0].pk)
+        self.get()
+
+    def get(self):
+        response = self.anonymous.get(f'/api/recipes/{self.recipe.pk}/')
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_recipe_changed(self):
+        self.recipe.name = 'Новое название'
+        self.recipe.save()
+        self.assertEqual(self.get()['name'], 'Новое название')
+
+    def test_tag_changed(self):
+        tag = self.tags[0]
+        tag.name = 'Новый тэг'
+        with self.captureOnCommitCallbacks(execute=True):
+            tag.save()
+        self.assertIn('Новый тэг', [tag['name'] for tag in self.get()['tags']])
+
+    def test_author_changed(self):
+        author = self.recipe.author
+        author.first_name = 'Автор'
+        author.save()
+        self.assertEqual(self.get()['author']['first_name'], 'Автор')
+
+    def test_login_keeps_cache(self):
+        author = self.recipe.author
+        author.save(update_fields=['last_login'])
+        with self.assertNumQueries(1):
+            self.get()
+
+
+class CounterFieldsTest(FoodgramTestCase):
+    """Полное сохранение устаревшего объекта не перезаписывает счётчики"""
+
+    def test_set_password_keeps_followers(self):
+        author = User.objects.get(pk=self.authors[1].pk)
+        response = self.client.post(f'/api/users/{author.pk}/subscribe/')
+        self.assertEqual(response.status_code, 201)
+        client = APIClient()
+        client.force_authenticate(author)
+        response = client.post('/api/users/set_password/', {
+            'current_password': 'password',
+            'new_password': 'N3w-secret-password',
+        })
+        self.assertEqual(response.status_code, 204)
+        author.refresh_from_db()
+        self.assertEqual(author.followers_count, 1)
+        self.assertTrue(author.check_password('N3w-secret-password'))
+
+    def test_recipe_save_keeps_favorites(self):
+        recipe = Recipe.objects.get(pk=self.recipes[10].pk)
+        self.authors[0].favorite.add(recipe)
+        recipe.name = 'Новое название'
+        recipe.save()
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.favorites_count, 1)
+        self.assertEqual(recipe.name, 'Новое название')
+
+
+class TimelineTest(FoodgramTestCase):
+    """Лента подписок: рассылка, подмешивание популярных авторов, курсор"""
+
+    def feed_ids(self, authors):
+        return list(Recipe.objects.filter(author__in=authors).order_by(
+            '-pub_date', '-id').values_list('id', flat=True))
+
+    def walk_feed(self, limit):
+        ids = []
+        url = f'/api/recipes/feed/?limit={limit}'
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertLessEqual(len(response.data['results']), limit)
+            ids += [recipe['id'] for recipe in response.data['results']]
+            url = response.data['next']
+        return ids
+
+    def timeline_ids(self, user):
+        return set(TimelineEntry.objects.filter(
+            user=user).values_list('recipe_id', flat=True))
+
+    def test_publish_and_backfill(self):
+        self.assertEqual(
+            self.timeline_ids(self.user), {r.pk for r in self.recipes[:8]})
+        recipe, = create_recipes(
+            self.authors[0], self.tags, self.ingredients, 1)
+        self.assertIn(recipe.pk, self.timeline_ids(self.user))
+        self.client.post(f'/api/users/{self.authors[1].pk}/subscribe/')
+        self.assertEqual(
+            len(self.timeline_ids(self.user)), len(self.recipes) + 1)
+        self.assertEqual(
+            self.walk_feed(5), self.feed_ids(self.authors))
+
+    def test_unsubscribe_removes_entries(self):
+        self.client.delete(f'/api/users/{self.authors[0].pk}/subscribe/')
+        self.assertEqual(self.timeline_ids(self.user), set())
+        self.assertEqual(self.walk_feed(5), [])
+
+    @override_settings(FEED_LENGTH=5)
+    def test_trim_off_write_path(self):
+        create_recipes(self.authors[0], self.tags, self.ingredients, 1)
+        self.assertEqual(len(self.timeline_ids(self.user)), 9)
+        self.assertEqual(timeline.trim_overflowing(), 1)
+        self.assertEqual(
+            self.timeline_ids(self.user),
+            set(self.feed_ids([self.authors[0]])[:5]))
+        self.assertEqual(timeline.trim_overflowing(), 0)
+
+    @override_settings(FEED_FANOUT_LIMIT=1)
+    def test_popular_author_merged(self):
+        author = self.authors[0]
+        Subscription.objects.create(user=self.authors[1], author=author)
+        self.assertTrue(PopularAuthor.objects.filter(author=author).exists())
+        self.assertFalse(TimelineEntry.objects.filter(author=author).exists())
+        recipe, = create_recipes(author, self.tags, self.ingredients, 1)
+        self.assertFalse(TimelineEntry.objects.filter(author=author).exists())
+        self.client.post(f'/api/users/{self.authors[1].pk}/subscribe/')
+        self.assertEqual(self.walk_feed(3), self.feed_ids(self.authors))
+        self.assertEqual(self.walk_feed(3)[0], recipe.pk)
+
+    @override_settings(FEED_FANOUT_LIMIT=2)
+    def test_mode_switch_hysteresis(self):
+        author = self.authors[0]
+        followers = [self.authors[1], User.objects.create_user(
+            'follower@example.com', 'follower', 'password')]
+        for follower in followers:
+            Subscription.objects.create(user=follower, author=author)
+        self.assertTrue(PopularAuthor.objects.filter(author=author).exists())
+
+        # 2 подписчика - не больше порога, но автор остаётся популярным,
+        # а его рецепты по-прежнему видны в ленте
+        Subscription.objects.filter(user=followers[1]).delete()
+        self.assertTrue(PopularAuthor.objects.filter(author=author).exists())
+        self.assertEqual(self.walk_feed(10), self.feed_ids([author]))
+
+        # 1 подписчик - вдвое меньше порога, ленты собираются заново
+        Subscription.objects.filter(user=followers[0]).delete()
+        self.assertFalse(PopularAuthor.objects.filter(author=author).exists())
+        self.assertEqual(
+            self.timeline_ids(self.user), set(self.feed_ids([author])))
+        self.assertEqual(self.walk_feed(10), self.feed_ids([author]))
+
+    def test_bad_cursor(self):
+        response = self.client.get('/api/recipes/feed/?cursor=abc')
+        self.assertEqual(response.status_code, 404)
+
+
+class KeysetPaginationTest(FoodgramTestCase):
+    """Список рецептов по курсору и по номеру страницы"""
+
+    def test_walk_pages(self):
+        ids = []
+        url = '/api/recipes/?cursor=&limit=5'
+        while url:
+            response = self.anonymous.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertNotIn('count', response.data)
+            ids += [recipe['id'] for recipe in response.data['results']]
+            url = response.data['next']
+        self.assertEqual(
+            ids, list(Recipe.objects.values_list('id', flat=True)))
+
+    def test_bad_cursor(self):
+        for cursor in ('abc', 'WyJhIl0=', 'WyJhIiwgImIiXQ=='):
+            with self.subTest(cursor=cursor):
+                response = self.anonymous.get(f'/api/recipes/?cursor={cursor}')
+                self.assertEqual(response.status_code, 404)
+
+    def test_cursor_with_search(self):
+        response = self.anonymous.get('/api/recipes/?cursor=&search=рецепт')
+        self.assertEqual(response.status_code, 400)
+        response = self.anonymous.get('/api/recipes/?search=рецепт')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['count'], len(self.recipes))
+
+    def test_page_and_limit(self):
+        response = self.anonymous.get('/api/recipes/?page=2&limit=5')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            list(response.data), ['count', 'next', 'previous', 'results'])
+        self.assertEqual(response.data['count'], len(self.recipes))
+        self.assertEqual(
+            [recipe['id'] for recipe in response.data['results']],
+            list(Recipe.objects.values_list('id', flat=True)[5:10]))
+        response = self.anonymous.get('/api/recipes/')
+        self.assertEqual(len(response.data['results']), 6)
+
+
+class RecipeSearchTest(FoodgramTestCase):
+    """Полнотекстовый поиск по названию и описанию"""
+
+    def setUp(self):
+        super().setUp()
+        self.borscht = self.create('Борщ украинский', 'Свекла и капуста')
+        self.soup = self.create('Суп дня', 'Почти борщ, но без капусты')
+        self.borscht.tags.set([self.tags[0]])
+        self.soup.tags.set([self.tags[1]])
+
+    def create(self, name, text):
+        return Recipe.objects.create(
+            author=self.authors[0], name=name, text=text, cooking_time=10,
+            image='recipes/images/test.png')
+
+    def search(self, query, **params):
+        response = self.anonymous.get(
+            '/api/recipes/', {'search': query, **params})
+        self.assertEqual(response.status_code, 200)
+        return [recipe['id'] for recipe in response.data['results']]
+
+    def test_name_and_text(self):
+        self.assertEqual(self.search('суп'), [self.soup.pk])
+        self.assertEqual(self.search('свекла'), [self.borscht.pk])
+        self.assertEqual(self.search('БОРЩ украинский'), [self.borscht.pk])
+        self.assertEqual(self.search('плов'), [])
+
+    def test_name_ranked_above_text(self):
+        self.assertEqual(
+            self.search('борщ'), [self.borscht.pk, self.soup.pk])
+
+    def test_with_tags(self):
+        self.assertEqual(self.search('борщ', tags='tag1'), [self.soup.pk])
+
+    def test_updated_after_save(self):
+        self.borscht.name = 'Щи'
+        self.borscht.save()
+        self.assertEqual(self.search('борщ'), [self.soup.pk])
+        self.assertEqual(self.search('щи'), [self.borscht.pk])
+
+    def test_removed_after_delete(self):
+        self.soup.delete()
+        self.assertEqual(self.search('борщ'), [self.borscht.pk])
+
+
+class IngredientSearchTest(FoodgramTestCase):
+    """Поиск ингредиентов по индексу в памяти"""
+
+    NAMES = ['Гречишный мёд', 'Мед липовый', 'Медь', 'Мёд']
+
+    def setUp(self):
+        super().setUp()
+        Ingredient.objects.bulk_create(
+            Ingredient(name=name, measurement_unit='г')
+            for name in self.NAMES)
+        catalogue.bump()
+        self.index = IngredientIndex()
+
+    def names(self, query, **kwargs):
+        return [entry['name'] for entry in self.index.search(query, **kwargs)]
+
+    def test_ranking(self):
+        expected = ['Мёд', 'Медь', 'Мед липовый', 'Гречишный мёд']
+        self.assertEqual(self.names('МЁД'), expected)
+        self.assertEqual(self.names('  мед '), expected)
+        self.assertEqual(self.names('липовый'), ['Мед липовый'])
+        response = self.anonymous.get('/api/ingredients/', {'name': 'Мед'})
+        self.assertEqual(
+            [entry['name'] for entry in response.data], expected)
+
+    def test_max_results(self):
+        Ingredient.objects.bulk_create(
+            Ingredient(name=f'Соль {number}', measurement_unit='г')
+            for number in range(MAX_RESULTS + 10))
+        catalogue.bump()
+        self.assertEqual(len(self.names('соль')), MAX_RESULTS)
+        self.assertEqual(len(self.names('соль', limit=5)), 5)
+
+    def test_rebuild_after_bump(self):
+        self.assertEqual(self.names('медовик'), [])
+        Ingredient.objects.create(name='Медовик', measurement_unit='г')
+        self.assertEqual(self.names('медовик'), [])
+        catalogue.bump()
+        self.assertEqual(self.names('медовик'), ['Медовик'])
+
+    def test_warm_index_without_queries(self):
+        self.names('мед')
+        with self.assertNumQueries(0):
+            self.assertEqual(len(self.names('мед')), len(self.NAMES))
@@ -0,0 +1,200 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F, Q
+from django.db.models.expressions import RawSQL, Window
+from django.db.models.functions import RowNumber
+
+from recipes.models import PopularAuthor, Recipe, TimelineEntry
+from users.models import Subscription, User
+
+BATCH_SIZE = 1000
+
+
+def get_length():
+    """Сколько последних рецептов хранится в ленте одного пользователя"""
+    return getattr(settings, 'FEED_LENGTH', 500)
+
+
+def get_fanout_limit():
+    """Рецепты авторов, у которых подписчиков больше, не рассылаются по
+    лентам при публикации, а подмешиваются при чтении"""
+    return getattr(settings, 'FEED_FANOUT_LIMIT', 1000)
+
+
+def get_push_limit():
+    """Популярный автор снова рассылает рецепты по лентам, только когда
+    подписчиков становится вдвое меньше FEED_FANOUT_LIMIT, чтобы режим не
+    переключался туда-обратно на каждой подписке у границы"""
+    return get_fanout_limit() // 2
+
+
+def _is_popular(author_id):
+    return PopularAuthor.objects.filter(author_id=author_id).exists()
+
+
+def _update_mode(author_id):
+    """Переключает режим автора по текущему числу подписчиков и возвращает
+    True, если его рецепты подмешиваются при чтении.
+
+    При переходе на подмешивание записи автора удаляются из лент, при
+    возврате к рассылке - заново добавляются всем подписчикам. Строка
+    автора блокируется, чтобы параллельные подписки не переключали режим
+    одновременно.
+    """
+    followers = User.objects.select_for_update().values_list(
+        'followers_count', flat=True).get(pk=author_id)
+    popular = _is_popular(author_id)
+    if not popular and followers > get_fanout_limit():
+        PopularAuthor.objects.create(author_id=author_id)
+        TimelineEntry.objects.filter(author_id=author_id).delete()
+        return True
+    if popular and followers <= get_push_limit():
+        PopularAuthor.objects.filter(author_id=author_id).delete()
+        user_ids = list(Subscription.objects.filter(
+            author_id=author_id).values_list('user_id', flat=True))
+        for user_id in user_ids:
+            _add_author(user_id, author_id)
+        trim(user_ids)
+        return False
+    return popular
+
+
+def _entries(user_ids, recipes):
+    return [
+        TimelineEntry(
+            user_id=user_id,
+            recipe_id=recipe_id,
+            author_id=author_id,
+            pub_date=pub_date,
+        )
+        for user_id in user_ids
+        for recipe_id, author_id, pub_date in recipes
+    ]
+
+
+def trim(users):
+    """Оставляет в лентах пользователей только get_length() последних
+    записей, одним DELETE с ROW_NUMBER() по пользователю"""
+    ranked = TimelineEntry.objects.filter(user__in=users).annotate(
+        timeline_rank=Window(
+            expression=RowNumber(),
+            partition_by=F('user_id'),
+            order_by=[F('pub_date').desc(), F('recipe_id').desc()],
+        )
+    ).order_by().values('id', 'timeline_rank')
+    sql, params = ranked.query.sql_with_params()
+    TimelineEntry.objects.filter(pk__in=RawSQL(
+        f'SELECT id FROM ({sql}) ranked WHERE timeline_rank > %s',
+        (*params, get_length())
+    )).delete()
+
+
+def trim_overflowing():
+    """Обрезает ленты, в которых записей больше get_length().
+
+    Публикация не обрезает ленты сама, чтобы не пересчитывать при создании
+    рецепта все ленты подписчиков: лишние записи удаляет обработчик задач
+    при периодическом обслуживании. Возвращает число обрезанных лент.
+    """
+    user_ids = list(TimelineEntry.objects.values('user_id').annotate(
+        entries=Count('id')).filter(
+            entries__gt=get_length()).values_list('user_id', flat=True))
+    if user_ids:
+        trim(user_ids)
+    return len(user_ids)
+
+
+@transaction.atomic
+def publish(recipe):
+    """Разносит новый рецепт по лентам подписчиков автора"""
+    if _is_popular(recipe.author_id):
+        return
+    followers = list(Subscription.objects.filter(
+        author_id=recipe.author_id).values_list('user_id', flat=True))
+    if not followers:
+        return
+    TimelineEntry.objects.bulk_create(
+        _entries(followers, [(recipe.pk, recipe.author_id, recipe.pub_date)]),
+        batch_size=BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+
+
+def _add_author(user_id, author_id):
+    recipes = Recipe.objects.filter(author_id=author_id).order_by(
+        '-pub_date', '-id').values_list(
+            'id', 'author_id', 'pub_date')[:get_length()]
+    TimelineEntry.objects.bulk_create(
+        _entries([user_id], recipes),
+        batch_size=BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+
+
+@transaction.atomic
+def backfill(user_id, author_id):
+    """Добавляет в ленту последние рецепты автора после подписки"""
+    if _update_mode(author_id):
+        return
+    _add_author(user_id, author_id)
+    trim([user_id])
+
+
+@transaction.atomic
+def remove(user_id, author_id):
+    """Убирает рецепты автора из ленты после отписки"""
+    TimelineEntry.objects.filter(user_id=user_id, author_id=author_id).delete()
+    _update_mode(author_id)
+
+
+@transaction.atomic
+def rebuild():
+    """Заново собирает все ленты, например после изменения FEED_LENGTH
+    или FEED_FANOUT_LIMIT"""
+    TimelineEntry.objects.all().delete()
+    PopularAuthor.objects.all().delete()
+    PopularAuthor.objects.bulk_create(
+        PopularAuthor(author_id=author_id)
+        for author_id in User.objects.filter(
+            followers_count__gt=get_fanout_limit()
+        ).values_list('id', flat=True)
+    )
+    subscriptions = Subscription.objects.filter(
+        author__popular__isnull=True
+    ).values_list('user_id', 'author_id')
+    for user_id, author_id in subscriptions.iterator():
+        _add_author(user_id, author_id)
+    trim(User.objects.all())
+    return TimelineEntry.objects.count()
+
+
+def _after(position, id_field):
+    """Записи после позиции (pub_date, id) при сортировке по убыванию"""
+    pub_date, pk = position
+    return Q(pub_date__lt=pub_date) | Q(
+        pub_date=pub_date, **{f'{id_field}__lt': pk})
+
+
+def get_page(user, position, limit):
+    """Рецепты ленты после position, не больше limit.
+
+    Разосланные рецепты читаются из ленты пользователя по индексу
+    (user, pub_date, recipe), рецепты популярных авторов (PopularAuthor) -
+    по индексу (author, pub_date, id), и две выборки сливаются.
+    """
+    entries = TimelineEntry.objects.filter(user=user)
+    popular = Recipe.objects.filter(author__in=Subscription.objects.filter(
+        user=user,
+        author__popular__isnull=False,
+    ).values('author_id'))
+    if position is not None:
+        entries = entries.filter(_after(position, 'recipe_id'))
+        popular = popular.filter(_after(position, 'id'))
+
+    rows = set(entries.order_by('-pub_date', '-recipe_id').values_list(
+        'pub_date', 'recipe_id')[:limit])
+    rows.update(popular.order_by('-pub_date', '-id').values_list(
+        'pub_date', 'id')[:limit])
+    ids = [pk for _, pk in sorted(rows, reverse=True)[:limit]]
+    recipes = Recipe.objects.in_bulk(ids)
+    return [recipes[pk] for pk in ids if pk in recipes]
@@ -1,27 +1,37 @@
 from django.urls import include, path, re_path
 from rest_framework.routers import DefaultRouter
 
+from .async_views import async_patterns
 from .views import (AllSubscribedViewSet, FavoriteViewSet, IngredientViewSet,
-                    RecipeViewSet, ShoppingCartViewSet, SubscribeViewSet,
-                    TagViewSet)
+                    JobViewSet, RecipeViewSet, ShoppingCartViewSet,
+                    SubscribeViewSet, TagViewSet, metrics_view)
 
 router = DefaultRouter()
 router.register(r'tags', TagViewSet)
 router.register(r'ingredients', IngredientViewSet)
 router.register(r'recipes', RecipeViewSet)
+router.register(r'jobs', JobViewSet, basename='jobs')
 
 
-urlpatterns = [
+urlpatterns = async_patterns([
     path('users/subscriptions/',
          AllSubscribedViewSet.as_view({'get': 'list'}),
          name='subscriptions'),
-
+]) + [
     path('recipes/download_shopping_cart/',
          ShoppingCartViewSet.as_view({'get': 'get_pdf'}),
          name='download_shopping_cart'),
+    path('recipes/shopping_cart/',
+         ShoppingCartViewSet.as_view(
+             {'post': 'batch_create', 'delete': 'batch_destroy'}),
+         name='shopping_cart_batch'),
+    path('recipes/favorite/',
+         FavoriteViewSet.as_view(
+             {'post': 'batch_create', 'delete': 'batch_destroy'}),
+         name='favorite_batch'),
 
     path('', include('djoser.urls')),
-    path('', include(router.urls)),
+    path('', include(async_patterns(router.urls))),
 
     path('users/<int:id_user>/subscribe/',
          SubscribeViewSet.as_view({'post': 'create', 'delete': 'destroy'}),
@@ -36,4 +46,6 @@ urlpatterns = [
          name='favorite'),
 
     re_path(r'^auth/', include('djoser.urls.authtoken')),
+
+    path('metrics/', metrics_view, name='metrics'),
 ]
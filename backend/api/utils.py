@@ -1,5 +1,7 @@
 from rest_framework.response import Response
 
+from api import relations
+
 
 def clear_ingredients_in_recipe(recipe):
     """Удаляет у рецепта все ингредиенты с их количество при удалении
@@ -7,9 +9,22 @@ def clear_ingredients_in_recipe(recipe):
     recipe.ingredients.all().delete()
 
 
-def is_authenticated(context):
-    """Проверка авторизован ли пользователь из контекста"""
-    return context['request'].user.is_authenticated
+def get_relations(context):
+    """Избранное, корзина и подписки пользователя из контекста, один раз
+    на сериализацию"""
+    if 'relations' not in context:
+        context['relations'] = relations.get_relations(
+            context['request'].user)
+    return context['relations']
+
+
+def get_recipes_limit(request):
+    """recipes_limit из запроса или 0, если ограничения нет. Нечисловое
+    значение не ограничивает число рецептов"""
+    try:
+        return max(int(request.query_params['recipes_limit']), 0)
+    except (KeyError, ValueError):
+        return 0
 
 
 def get_response_as_error(message, status_response):
@@ -1,35 +1,41 @@
 import io
 
-from django.db.models import Sum
-from django.http import FileResponse
+from django.conf import settings
+from django.db.models import Prefetch, prefetch_related_objects
+from django.http import FileResponse, HttpResponse, HttpResponseForbidden
 from django.shortcuts import get_object_or_404
-from reportlab.pdfbase import pdfmetrics
-from reportlab.pdfbase.ttfonts import TTFont
-from reportlab.pdfgen import canvas
-from rest_framework import permissions, status, viewsets
+from django.urls import reverse
+from django.utils.crypto import constant_time_compare
+from rest_framework import mixins, permissions, status, viewsets
+from rest_framework.decorators import action
 from rest_framework.response import Response
 
-from recipes.models import Ingredient, Recipe, Tag
+from backend.db import pooler
+from recipes.models import Ingredient, Job, Recipe, Tag
 from users.models import Subscription, User
 
+from . import jobs, metrics, recipe_cache, relations, shopping_list, timeline
 from .filters import IngredientSearchFilterBackend, RecipeFilterBackend
-from .mixins import CreateDeleteMixin, ListViewSet
-from .paginators import PageLimitPaginator
+from .ingredient_search import ingredient_index
+from .mixins import (CatalogueCacheMixin, CreateDeleteMixin, ListViewSet,
+                     RecipeCacheMixin)
+from .paginators import FeedPaginator, KeysetPaginator
 from .permissions import RecipesPermissions
 from .serializers import (AddRecipeSerializer, IngredientSerializer,
-                          RecipeSerializer, TagSerializer,
+                          JobSerializer, RecipeSerializer, TagSerializer,
                           UserRecipeSerializer)
-from .utils import get_response_as_error
+from .utils import get_recipes_limit, get_response_as_error
 
 
-class TagViewSet(viewsets.ReadOnlyModelViewSet):
+class TagViewSet(CatalogueCacheMixin, viewsets.ReadOnlyModelViewSet):
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
     permission_classes = [permissions.AllowAny]
     pagination_class = None
 
 
-class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
+class IngredientViewSet(CatalogueCacheMixin,
+                        viewsets.ReadOnlyModelViewSet):
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
@@ -37,60 +43,95 @@ class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
     search_fields = ['^name']
     pagination_class = None
 
+    def list(self, request, *args, **kwargs):
+        return self.catalogue_response(self.search, request)
 
-class RecipeViewSet(viewsets.ModelViewSet):
+    def search(self, request):
+        name = request.query_params.get(
+            IngredientSearchFilterBackend.search_param, '')
+        return Response(ingredient_index.search(name))
+
+
+class RecipeViewSet(RecipeCacheMixin, viewsets.ModelViewSet):
     queryset = Recipe.objects.all()
     permission_classes = [RecipesPermissions]
-    pagination_class = PageLimitPaginator
+    pagination_class = FeedPaginator
     filter_backends = [RecipeFilterBackend]
 
     def get_serializer_class(self):
-        if self.action in ('list', 'retrieve'):
+        if self.action in ('list', 'retrieve', 'feed'):
             return RecipeSerializer
         return AddRecipeSerializer
 
+    @action(detail=False, permission_classes=[permissions.IsAuthenticated])
+    def feed(self, request):
+        """Рецепты авторов из подписок, новые первыми, по курсору"""
+        paginator = KeysetPaginator()
+        page = paginator.paginate_fetch(
+            lambda position, limit: timeline.get_page(
+                request.user, position, limit),
+            request
+        )
+        return paginator.get_paginated_response(
+            recipe_cache.get_representations(
+                page, self.get_serializer_context()))
 
-class ShoppingCartViewSet(viewsets.ViewSet, CreateDeleteMixin):
+
+def get_job_response(request, job):
+    """202 с задачей, адрес для проверки статуса - в Location"""
+    return Response(
+        JobSerializer(job, context={'request': request}).data,
+        status.HTTP_202_ACCEPTED,
+        headers={'Location': request.build_absolute_uri(
+            reverse('jobs-detail', args=[job.pk]))},
+    )
+
+
+class JobViewSet(mixins.CreateModelMixin, mixins.RetrieveModelMixin,
+                 viewsets.GenericViewSet):
+    """Фоновые задачи пользователя: постановка, статус и результат"""
+    serializer_class = JobSerializer
     permission_classes = [permissions.IsAuthenticated]
 
-    def get_pdf(self, request):
-        user = request.user
+    def get_queryset(self):
+        return self.request.user.jobs.all()
+
+    def create(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        return get_job_response(
+            request,
+            jobs.enqueue(request.user, serializer.validated_data['kind'])
+        )
 
-        recipes = user.shopping_cart.all()
-
-        queryset = Ingredient.objects.filter(
-            ingredient_count__recipe__in=recipes
-        ).values('name', 'measurement_unit').annotate(
-            count=(Sum('ingredient_count__amount')))
-
-        pdfmetrics.registerFont(TTFont(
-            'Arkhip',
-            'fonts/arkhip_font.ttf',
-            'UTF-8'
-        ))
-
-        buffer = io.BytesIO()
-
-        page = canvas.Canvas(buffer)
-        page.setFont('Arkhip', size=32)
-        page.drawString(150, 800, 'Список покупок')
-        page.setFont('Arkhip', size=18)
-        height = 760
-
-        for i, (ingredient) in enumerate(queryset, 1):
-            page.drawString(
-                55,
-                height,
-                f'{i}. {ingredient["name"]}: {ingredient["count"]} '
-                f'{ingredient["measurement_unit"]}'
+    @action(detail=True)
+    def result(self, request, pk=None):
+        job = self.get_object()
+        if job.status != Job.Status.DONE:
+            return get_response_as_error(
+                'Задача завершилась с ошибкой'
+                if job.status == Job.Status.FAILED
+                else 'Задача ещё не выполнена',
+                status.HTTP_409_CONFLICT
             )
-            height -= 30
+        return FileResponse(
+            job.result.open('rb'), as_attachment=True, filename=job.filename)
+
 
-        page.showPage()
-        page.save()
-        buffer.seek(0)
+class ShoppingCartViewSet(viewsets.ViewSet, CreateDeleteMixin):
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get_pdf(self, request):
+        """Небольшой список рисуется сразу, большой - фоновой задачей"""
+        user = request.user
+        if (shopping_list.get_cached_pdf(user) is None
+                and shopping_list.is_large(user)):
+            return get_job_response(
+                request, jobs.enqueue(user, 'shopping_list_pdf'))
         return FileResponse(
-            buffer, as_attachment=True, filename='Список покупок.pdf'
+            io.BytesIO(shopping_list.get_pdf(user)),
+            as_attachment=True,
+            filename=shopping_list.FILENAME,
         )
 
     def create(self, request, id_recipe):
@@ -101,6 +142,12 @@ class ShoppingCartViewSet(viewsets.ViewSet, CreateDeleteMixin):
         attribute = 'shopping_cart'
         return self.custom_destroy(request, id_recipe, attribute)
 
+    def batch_create(self, request):
+        return self.custom_batch_create(request, 'shopping_cart')
+
+    def batch_destroy(self, request):
+        return self.custom_batch_destroy(request, 'shopping_cart')
+
 
 class FavoriteViewSet(viewsets.ViewSet, CreateDeleteMixin):
 
@@ -114,14 +161,37 @@ class FavoriteViewSet(viewsets.ViewSet, CreateDeleteMixin):
         attribute = 'favorite'
         return self.custom_destroy(request, id_recipe, attribute)
 
+    def batch_create(self, request):
+        return self.custom_batch_create(request, 'favorite')
+
+    def batch_destroy(self, request):
+        return self.custom_batch_destroy(request, 'favorite')
+
 
 class AllSubscribedViewSet(ListViewSet):
     serializer_class = UserRecipeSerializer
     permission_classes = [permissions.IsAuthenticated]
-    pagination_class = PageLimitPaginator
+    pagination_class = FeedPaginator
+    cursor_ordering = ('id',)
 
     def get_queryset(self):
-        return User.objects.filter(following__user=self.request.user)
+        return User.objects.filter(
+            following__user=self.request.user
+        ).order_by('id')
+
+    def paginate_queryset(self, queryset):
+        page = super().paginate_queryset(queryset)
+        if page:
+            self._prefetch_recipes(page)
+        return page
+
+    def _prefetch_recipes(self, authors):
+        recipes = Recipe.objects.filter(author__in=authors)
+        recipes_limit = get_recipes_limit(self.request)
+        if recipes_limit:
+            recipes = recipes.latest_per_author(recipes_limit)
+        prefetch_related_objects(authors, Prefetch(
+            'recipes', queryset=recipes, to_attr='recent_recipes'))
 
 
 class SubscribeViewSet(viewsets.ViewSet):
@@ -142,6 +212,7 @@ class SubscribeViewSet(viewsets.ViewSet):
             )
 
         Subscription.objects.create(user=request.user, author=author)
+        relations.invalidate(request.user.id)
         serializer = UserRecipeSerializer(author, context={'request': request})
         return Response(serializer.data, status.HTTP_201_CREATED)
 
@@ -157,5 +228,23 @@ class SubscribeViewSet(viewsets.ViewSet):
 
         subscribe = request.user.follower.filter(author=author)
         subscribe.delete()
+        relations.invalidate(request.user.id)
 
         return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+def metrics_view(request):
+    """Гистограммы запросов всех воркеров в формате Prometheus. Нужен
+    заголовок Authorization: Bearer <METRICS_TOKEN>, без токена в
+    настройках адрес закрыт"""
+    token = getattr(settings, 'METRICS_TOKEN', '')
+    if not token or not constant_time_compare(
+            request.headers.get('Authorization', ''), f'Bearer {token}'):
+        return HttpResponseForbidden()
+    return HttpResponse(
+        metrics.render({
+            **metrics.get_registry().collect(),
+            **pooler.get_waits(),
+        }),
+        content_type='text/plain; version=0.0.4; charset=utf-8',
+    )
@@ -0,0 +1,58 @@
+import time
+
+from api import metrics
+
+
+class PersistentConnectionMixin:
+    """Постоянное соединение воркера с проверкой перед повторным
+    использованием.
+
+    Django 4.0 переиспользует соединение при CONN_MAX_AGE не проверяя его:
+    если база или пулер закрыли соединение за время простоя, запрос падает
+    с ошибкой. С CONN_HEALTH_CHECKS соединение проверяется при первом
+    обращении к базе в каждом запросе и при необходимости открывается
+    заново, как в Django 4.1. Соединение, на котором были ошибки, Django
+    закрывает в конце запроса, и следующий запрос открывает новое.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.checked_out = False
+        self.recycled = False
+
+    def close_if_unusable_or_obsolete(self):
+        """Вызывается Django в начале и в конце каждого запроса. Чтение
+        autocommit внутри не считается обращением к базе"""
+        self.checked_out = True
+        broken = self.connection is not None and self.errors_occurred
+        super().close_if_unusable_or_obsolete()
+        if broken and self.connection is None:
+            self.recycled = True
+        self.checked_out = False
+
+    def ensure_connection(self):
+        if not self.checked_out and not self.in_atomic_block:
+            self.checked_out = True
+            self._check_out()
+        super().ensure_connection()
+
+    def _check_out(self):
+        if self.connection is None:
+            result = 'reconnect' if self.recycled else 'new'
+        elif (not self.settings_dict.get('CONN_HEALTH_CHECKS')
+                or self.is_usable()):
+            result = 'reused'
+        else:
+            self.close()
+            result = 'reconnect'
+        self.recycled = False
+        metrics.get_registry().increment(
+            'foodgram_db_checkouts_total', (self.alias, result))
+
+    def connect(self):
+        start = time.perf_counter()
+        super().connect()
+        metrics.get_registry().observe(
+            (self.alias,),
+            {'foodgram_db_connect_seconds': time.perf_counter() - start}
+        )
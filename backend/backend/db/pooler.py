@@ -0,0 +1,51 @@
+import logging
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+def get_waits():
+    """Очередь клиентов pgbouncer по базам из SHOW POOLS: число ждущих
+    соединения с базой (cl_waiting) и самое долгое ожидание (maxwait).
+
+    Внутри приложения ожиданий нет: у воркера одно соединение на базу, и
+    запрос его не делит. Ждут клиенты в пулере, когда все соединения
+    пула заняты, поэтому значения читаются из консоли pgbouncer по
+    DB_POOLER_STATS_DSN. Без настройки или при ошибке - пустой словарь.
+    """
+    dsn = getattr(settings, 'DB_POOLER_STATS_DSN', '')
+    if not dsn:
+        return {}
+    # psycopg2 есть только в образе с PostgreSQL
+    import psycopg2
+
+    try:
+        connection = psycopg2.connect(dsn, connect_timeout=2)
+    except psycopg2.Error:
+        logger.warning('pgbouncer stats are unavailable', exc_info=True)
+        return {}
+    # Консоль pgbouncer не поддерживает транзакции
+    connection.autocommit = True
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute('SHOW POOLS')
+            columns = [column.name for column in cursor.description]
+            pools = [dict(zip(columns, row)) for row in cursor.fetchall()]
+    finally:
+        connection.close()
+
+    waiting, max_wait = {}, {}
+    for pool in pools:
+        database = pool['database']
+        waiting[database] = waiting.get(database, 0) + pool['cl_waiting']
+        max_wait[database] = max(
+            max_wait.get(database, 0),
+            pool['maxwait'] + pool.get('maxwait_us', 0) / 1_000_000,
+        )
+    return {
+        'foodgram_db_pooler_waiting_clients': {
+            database: [value] for database, value in waiting.items()},
+        'foodgram_db_pooler_max_wait_seconds': {
+            database: [value] for database, value in max_wait.items()},
+    }
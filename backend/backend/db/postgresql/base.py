@@ -0,0 +1,7 @@
+from django.db.backends.postgresql import base
+
+from backend.db.connections import PersistentConnectionMixin
+
+
+class DatabaseWrapper(PersistentConnectionMixin, base.DatabaseWrapper):
+    pass
@@ -27,6 +27,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'api.middleware.RequestMetricsMiddleware',
+    'api.middleware.ReplicaMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -86,19 +88,83 @@ USE_TZ = True
 STATIC_URL = '/backend_static/'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+# Имена загруженных файлов - хэш содержимого, nginx отдаёт их с кэшем
+# на год. Файлы без ссылок удаляет команда gc_images
+DEFAULT_FILE_STORAGE = 'recipes.storage.ContentAddressedStorage'
+
+# Кэш избранного, корзины и подписок пользователя. Для тестов и одного
+# процесса подходит api.relations.LocMemLRUBackend
+RELATIONS_CACHE = {
+    'BACKEND': 'api.relations.DjangoCacheBackend',
+    'OPTIONS': {
+        'timeout': 300,
+    },
+}
+
+RECIPE_IMAGE_WORKERS = int(os.getenv('RECIPE_IMAGE_WORKERS', default=2))
+
+# Сколько секунд хранить представление рецепта без флагов пользователя
+RECIPE_CACHE_TIMEOUT = int(
+    os.getenv('RECIPE_CACHE_TIMEOUT', default=60 * 60 * 24))
+
+# Асинхронные list и retrieve рецептов, справочников и подписок под ASGI.
+# По умолчанию выключены: в bench_read_path ASGI пока медленнее WSGI
+ASYNC_VIEWS = os.getenv('ASYNC_VIEWS', default='False') == 'True'
+ASYNC_VIEW_WORKERS = int(os.getenv('ASYNC_VIEW_WORKERS', default=8))
+
+# Алиасы реплик для чтения в DATABASES и сколько секунд после записи
+# пользователь читает из основной базы. Для нескольких серверов нужен
+# общий кэш
+DATABASE_ROUTERS = ['api.replicas.ReplicaRouter']
+REPLICA_DATABASES = []
+REPLICA_STICKY_SECONDS = int(
+    os.getenv('DB_REPLICA_STICKY_SECONDS', default=10))
+
+# Длина ленты подписок и число подписчиков, до которого новые рецепты
+# автора рассылаются по лентам при публикации
+FEED_LENGTH = int(os.getenv('FEED_LENGTH', default=500))
+FEED_FANOUT_LIMIT = int(os.getenv('FEED_FANOUT_LIMIT', default=1000))
+
+# Фоновые задачи (команда run_jobs): список покупок длиннее
+# SHOPPING_LIST_SYNC_LIMIT позиций выгружается задачей. Зависшая дольше
+# JOB_TIMEOUT секунд задача перезапускается до JOB_MAX_ATTEMPTS раз,
+# результаты хранятся JOB_RESULT_TTL секунд
+SHOPPING_LIST_SYNC_LIMIT = int(
+    os.getenv('SHOPPING_LIST_SYNC_LIMIT', default=50))
+JOB_TIMEOUT = int(os.getenv('JOB_TIMEOUT', default=600))
+JOB_MAX_ATTEMPTS = int(os.getenv('JOB_MAX_ATTEMPTS', default=3))
+JOB_RESULT_TTL = int(os.getenv('JOB_RESULT_TTL', default=60 * 60 * 24))
+
+# Метрики запросов: общий для воркеров каталог, запросы дольше
+# SLOW_REQUEST_THRESHOLD секунд пишутся в лог. /api/metrics/ отвечает только
+# с заголовком Authorization: Bearer <METRICS_TOKEN>, без токена закрыт
+METRICS_DIR = os.getenv('METRICS_DIR', default='/tmp/foodgram_metrics')
+METRICS_FLUSH_INTERVAL = float(os.getenv('METRICS_FLUSH_INTERVAL', default=1))
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', default='')
+SLOW_REQUEST_THRESHOLD = float(
+    os.getenv('SLOW_REQUEST_THRESHOLD', default=0.5))
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# Сколько секунд держать проверенный токен в кэше
+AUTH_TOKEN_CACHE_TIMEOUT = int(os.getenv('AUTH_TOKEN_CACHE_TIMEOUT', default=60))
+
+# Basic-авторизация хэширует пароль (PBKDF2) на каждом запросе, клиентам
+# лучше получать токен. Отключается AUTH_BASIC_ENABLED=False
+AUTH_BASIC_ENABLED = os.getenv('AUTH_BASIC_ENABLED', default='True') == 'True'
+
 REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
 
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
-        'rest_framework.authentication.BasicAuthentication',
+        'api.authentication.CachedTokenAuthentication',
         # 'rest_framework.authentication.SessionAuthentication',
-    ],
+    ] + (
+        ['rest_framework.authentication.BasicAuthentication']
+        if AUTH_BASIC_ENABLED else []
+    ),
 
     'DEFAULT_PAGINATION_CLASS':
         'rest_framework.pagination.PageNumberPagination',
@@ -12,15 +12,53 @@ ALLOWED_HOSTS += [
     'sapp.tk',
 ]
 
+# Соединение воркера живёт DB_CONN_MAX_AGE секунд и проверяется перед
+# повторным использованием. DB_POOLER=transaction - за пулером в режиме
+# транзакций (pgbouncer): серверные курсоры между транзакциями там не живут.
+# DB_POOLER_STATS_DSN - консоль pgbouncer для метрик ожидания, например
+# "host=pgbouncer port=5432 dbname=pgbouncer user=... password=..."
+DB_POOLER = os.getenv('DB_POOLER', default='')
+DB_POOLER_STATS_DSN = os.getenv('DB_POOLER_STATS_DSN', default='')
+
+# Обёртка над django.db.backends.postgresql с проверкой соединений, поэтому
+# движок не берётся из DB_ENGINE
 DATABASES = {
     'default': {
-        'ENGINE': os.getenv('DB_ENGINE', default='django.db.backends.postgresql'),
+        'ENGINE': 'backend.db.postgresql',
         'NAME': os.getenv('DB_NAME', default='db'),
         'USER': os.getenv('POSTGRES_USER', default='user'),
         'PASSWORD': os.getenv('POSTGRES_PASSWORD', default='password'),
         'HOST': os.getenv('DB_HOST', default='127.0.0.1'),
         'PORT': os.getenv('DB_PORT', default=5432),
+        'CONN_MAX_AGE': int(os.getenv('DB_CONN_MAX_AGE', default=600)),
+        'CONN_HEALTH_CHECKS': os.getenv(
+            'DB_HEALTH_CHECKS', default='True') == 'True',
+        'DISABLE_SERVER_SIDE_CURSORS': DB_POOLER == 'transaction',
     }
 }
 
+# Реплики для чтения: DB_REPLICA_HOSTS=host1,host2 с теми же именем базы
+# и пользователем, что у основной
+for number, host in enumerate(
+        os.getenv('DB_REPLICA_HOSTS', default='').split(','), 1):
+    if host.strip():
+        DATABASES[f'replica_{number}'] = {
+            **DATABASES['default'],
+            'HOST': host.strip(),
+            'TEST': {'MIRROR': 'default'},
+        }
+REPLICA_DATABASES = [alias for alias in DATABASES if alias != 'default']
+
 STATIC_ROOT = os.path.join(BASE_DIR, 'backend_static')
+
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv('CACHE_BACKEND', default='django.core.cache.backends.filebased.FileBasedCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', default='/tmp/foodgram_cache'),
+    },
+    # Отдельный кэш для bench_run: прогон очищает его целиком
+    'benchmark': {
+        'BACKEND': os.getenv('CACHE_BACKEND', default='django.core.cache.backends.filebased.FileBasedCache'),
+        'LOCATION': os.getenv('BENCHMARK_CACHE_LOCATION', default='/tmp/foodgram_benchmark_cache'),
+    },
+}
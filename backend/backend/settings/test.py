@@ -0,0 +1,20 @@
+import tempfile
+
+from .base import *
+
+# Тесты: SQLite и база реплики. В тестах это отдельная база без данных -
+# отстающая реплика, роутер включается через REPLICA_DATABASES
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+    },
+}
+DATABASES['replica_1'] = DATABASES['default'].copy()
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+}
+METRICS_DIR = os.path.join(tempfile.gettempdir(), 'foodgram_test_metrics')
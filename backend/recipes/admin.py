@@ -1,5 +1,6 @@
 from django.contrib import admin
 
+from . import search
 from .models import AmountIngredient, Ingredient, Recipe, Tag
 
 
@@ -17,11 +18,18 @@ class TagAdmin(admin.ModelAdmin):
 class RecipeAdmin(admin.ModelAdmin):
     list_display = ['name', 'author']
     list_filter = ['author', 'name', 'tags']
-    search_fields = ['author', 'name']
+    search_fields = ['name', 'text']
     inlines = [RecipeIngredientsInLine]
-    readonly_fields = ['favorite_count']
+    readonly_fields = ['favorites_count']
     fields = ['author', 'name', 'image', 'text', 'cooking_time', 'tags',
-              'favorite_count', 'favorite', 'shopping_carts']
+              'favorites_count', 'favorite', 'shopping_carts']
+
+    def get_search_results(self, request, queryset, search_term):
+        """Поиск по полнотекстовому индексу вместо icontains"""
+        match = search.matches(search_term)
+        if match is None:
+            return queryset, False
+        return queryset.filter(match), False
 
 
 @admin.register(Ingredient)
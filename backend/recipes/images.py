@@ -0,0 +1,148 @@
+import io
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection, transaction
+from django.utils import timezone
+from PIL import Image, ImageOps
+
+from .models import Recipe
+
+VARIANTS_DIR = 'recipes/variants/'
+
+# Ширина и высота, в которые вписывается копия
+VARIANTS = {
+    'card': (480, 480),
+    'detail': (960, 960),
+    'retina': (1920, 1920),
+}
+
+FORMATS = {
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+    'jpeg': ('JPEG', {'quality': 85, 'optimize': True, 'progressive': True}),
+}
+
+
+@lru_cache(maxsize=None)
+def get_executor():
+    """Пул потоков для обработки фото вне запроса, один на процесс"""
+    return ThreadPoolExecutor(
+        max_workers=getattr(settings, 'RECIPE_IMAGE_WORKERS', 2),
+        thread_name_prefix='recipe-images',
+    )
+
+
+def _render(image, size, image_format, options):
+    copy = image.copy()
+    copy.thumbnail(size, Image.LANCZOS)
+    if image_format == 'JPEG' and copy.mode != 'RGB':
+        copy = copy.convert('RGB')
+    buffer = io.BytesIO()
+    copy.save(buffer, image_format, **options)
+    return buffer.getvalue()
+
+
+def generate_variants(recipe_id):
+    """Делает уменьшенные копии фото рецепта во всех форматах и сохраняет
+    их пути в image_variants"""
+    recipe = Recipe.objects.filter(pk=recipe_id).first()
+    if recipe is None or not recipe.image:
+        return {}
+
+    with recipe.image.open('rb') as file:
+        image = ImageOps.exif_transpose(Image.open(file))
+        image.load()
+
+    variants = {}
+    for variant, size in VARIANTS.items():
+        variants[variant] = {}
+        for extension, (image_format, options) in FORMATS.items():
+            variants[variant][extension] = default_storage.save(
+                f'{VARIANTS_DIR}{variant}.{extension}',
+                ContentFile(_render(image, size, image_format, options))
+            )
+
+    Recipe.objects.filter(
+        pk=recipe_id, image=recipe.image.name
+    ).update(image_variants=variants, updated=timezone.now())
+    return variants
+
+
+def get_referenced_names():
+    """Файлы, на которые ссылаются рецепты: фото и их копии"""
+    names = set()
+    for image, variants in Recipe.objects.values_list(
+            'image', 'image_variants').iterator():
+        if image:
+            names.add(image)
+        names.update(
+            name for formats in variants.values()
+            for name in formats.values()
+        )
+    return names
+
+
+def _walk(directory):
+    directories, files = default_storage.listdir(directory)
+    for name in files:
+        yield f'{directory}{name}'
+    for child in directories:
+        yield from _walk(f'{directory}{child}/')
+
+
+def _find_garbage(referenced, deadline):
+    for directory in (Recipe.image.field.upload_to, VARIANTS_DIR):
+        if not default_storage.exists(directory):
+            continue
+        for name in list(_walk(directory)):
+            if (name not in referenced
+                    and default_storage.get_modified_time(name) <= deadline):
+                yield name
+
+
+def collect_garbage(min_age, dry_run=False):
+    """Удаляет файлы фото и копий, на которые не ссылается ни один рецепт.
+
+    Файлы моложе min_age секунд не трогаются: они могут принадлежать ещё
+    не зафиксированной транзакции или копиям, которые сейчас делаются.
+    Перед удалением ссылки читаются заново: пока каталог обходился, рецепт
+    мог сослаться на старый файл с тем же содержимым. Возвращает число
+    файлов и их размер.
+    """
+    deadline = timezone.now() - timedelta(seconds=min_age)
+    garbage = set(_find_garbage(get_referenced_names(), deadline))
+    if garbage:
+        garbage -= get_referenced_names()
+    count = size = 0
+    for name in sorted(garbage):
+        if default_storage.get_modified_time(name) > deadline:
+            continue
+        count += 1
+        size += default_storage.size(name)
+        if not dry_run:
+            default_storage.delete(name)
+    return count, size
+
+
+def delete_unreferenced(names):
+    """Удаляет файлы из names, если на них не ссылается ни один рецепт"""
+    for name in set(names) - get_referenced_names():
+        default_storage.delete(name)
+
+
+def _generate_in_worker(recipe_id):
+    try:
+        return generate_variants(recipe_id)
+    finally:
+        connection.close()
+
+
+def schedule_variants(recipe):
+    """Ставит обработку фото в пул после фиксации транзакции"""
+    transaction.on_commit(
+        lambda: get_executor().submit(_generate_in_worker, recipe.pk)
+    )
@@ -0,0 +1,25 @@
+from django.db import migrations
+
+INDEXES = [
+    ('recipes_recipe_tags_tag_recipe_idx',
+     'recipes_recipe_tags', 'tag_id, recipe_id'),
+    ('recipes_recipe_favorite_user_recipe_idx',
+     'recipes_recipe_favorite', 'user_id, recipe_id'),
+    ('recipes_recipe_carts_user_recipe_idx',
+     'recipes_recipe_shopping_carts', 'user_id, recipe_id'),
+]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0005_shoppinglistitem'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            sql=f'CREATE INDEX {name} ON {table} ({columns});',
+            reverse_sql=f'DROP INDEX {name};',
+        )
+        for name, table, columns in INDEXES
+    ]
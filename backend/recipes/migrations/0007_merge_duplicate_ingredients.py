@@ -0,0 +1,58 @@
+from django.db import migrations, models
+
+
+def merge_duplicate_ingredients(apps, schema_editor):
+    """Сливает ингредиенты с одинаковыми названием и единицей измерения в
+    один, перенося на него количества в рецептах"""
+    Ingredient = apps.get_model('recipes', 'Ingredient')
+    AmountIngredient = apps.get_model('recipes', 'AmountIngredient')
+    ShoppingListItem = apps.get_model('recipes', 'ShoppingListItem')
+
+    duplicates = Ingredient.objects.values(
+        'name', 'measurement_unit'
+    ).annotate(
+        keep=models.Min('id'), total=models.Count('id')
+    ).filter(total__gt=1)
+    if not duplicates:
+        return
+
+    for group in duplicates:
+        keep = group['keep']
+        extra = Ingredient.objects.filter(
+            name=group['name'], measurement_unit=group['measurement_unit']
+        ).exclude(id=keep)
+        for amount in AmountIngredient.objects.filter(ingredient__in=extra):
+            kept = AmountIngredient.objects.filter(
+                recipe_id=amount.recipe_id, ingredient_id=keep).first()
+            if kept is None:
+                amount.ingredient_id = keep
+                amount.save()
+            else:
+                kept.amount += amount.amount
+                kept.save()
+                amount.delete()
+        extra.delete()
+
+    ShoppingListItem.objects.all().delete()
+    rows = AmountIngredient.objects.filter(
+        recipe__shopping_carts__isnull=False
+    ).values('recipe__shopping_carts', 'ingredient').annotate(
+        total=models.Sum('amount'))
+    ShoppingListItem.objects.bulk_create(
+        ShoppingListItem(user_id=row['recipe__shopping_carts'],
+                         ingredient_id=row['ingredient'],
+                         amount=row['total'])
+        for row in rows
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0006_recipe_relation_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            merge_duplicate_ingredients, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,45 @@
+from django.db import migrations
+
+VECTOR_SQL = (
+    "setweight(to_tsvector('russian', name), 'A') || "
+    "setweight(to_tsvector('russian', text), 'B')"
+)
+
+
+def create_search_index(apps, schema_editor):
+    """PostgreSQL: столбец tsvector с GIN-индексом, SQLite: таблица FTS5"""
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute(
+            'ALTER TABLE recipes_recipe ADD COLUMN search_vector tsvector;')
+        schema_editor.execute(
+            f'UPDATE recipes_recipe SET search_vector = {VECTOR_SQL};')
+        schema_editor.execute(
+            'CREATE INDEX recipes_recipe_search_idx '
+            'ON recipes_recipe USING gin (search_vector);')
+    elif vendor == 'sqlite':
+        schema_editor.execute(
+            'CREATE VIRTUAL TABLE recipes_recipe_fts USING fts5(name, text);')
+        schema_editor.execute(
+            'INSERT INTO recipes_recipe_fts (rowid, name, text) '
+            'SELECT id, name, text FROM recipes_recipe;')
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute(
+            'ALTER TABLE recipes_recipe DROP COLUMN search_vector;')
+    elif vendor == 'sqlite':
+        schema_editor.execute('DROP TABLE recipes_recipe_fts;')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0011_recipe_favorites_count'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 4.0.6 on 2026-10-18 20:53
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def mark_popular_authors(apps, schema_editor):
+    User = apps.get_model('users', 'User')
+    PopularAuthor = apps.get_model('recipes', 'PopularAuthor')
+    PopularAuthor.objects.bulk_create(
+        PopularAuthor(author_id=author_id)
+        for author_id in User.objects.filter(
+            followers_count__gt=getattr(settings, 'FEED_FANOUT_LIMIT', 1000)
+        ).values_list('id', flat=True)
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0002_user_counters'),
+        ('recipes', '0015_job'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PopularAuthor',
+            fields=[
+                ('author', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='popular', serialize=False, to=settings.AUTH_USER_MODEL, verbose_name='Автор')),
+            ],
+            options={
+                'verbose_name': 'Популярный автор',
+                'verbose_name_plural': 'Популярные авторы',
+            },
+        ),
+        migrations.RunPython(mark_popular_authors, migrations.RunPython.noop),
+    ]
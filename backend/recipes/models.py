@@ -1,7 +1,10 @@
+from django.core.exceptions import EmptyResultSet
 from django.core.validators import validate_slug
 from django.db import models
+from django.db.models.expressions import RawSQL, Window
+from django.db.models.functions import RowNumber
 
-from users.models import User
+from users.models import CounterFieldsMixin, User
 
 
 class Tag(models.Model):
@@ -44,12 +47,48 @@ class Ingredient(models.Model):
     class Meta:
         verbose_name = 'Ингредиент'
         verbose_name_plural = 'Ингредиенты'
+        constraints = [
+            models.UniqueConstraint(
+                name='unique_ingredient',
+                fields=['name', 'measurement_unit']
+            )
+        ]
 
     def __str__(self):
         return f'{self.name} {self.measurement_unit}'
 
 
-class Recipe(models.Model):
+class RecipeQuerySet(models.QuerySet):
+    def with_related(self):
+        """Подгружает автора, тэги и ингредиенты, чтобы сериализация не
+        делала запросов на каждый рецепт"""
+        ingredients = models.Prefetch(
+            'ingredients',
+            queryset=AmountIngredient.objects.select_related('ingredient')
+        )
+        return self.select_related('author').prefetch_related(
+            'tags', ingredients)
+
+    def latest_per_author(self, limit):
+        """Не больше limit последних рецептов каждого автора одним запросом
+        с ROW_NUMBER() по автору"""
+        ranked = self.annotate(recipe_rank=Window(
+            expression=RowNumber(),
+            partition_by=models.F('author_id'),
+            order_by=models.F('pub_date').desc(),
+        )).order_by().values('id', 'recipe_rank')
+        try:
+            sql, params = ranked.query.sql_with_params()
+        except EmptyResultSet:
+            # Условие заведомо ложно, например author__in=[]
+            return self.none()
+        return self.model.objects.filter(pk__in=RawSQL(
+            f'SELECT id FROM ({sql}) ranked WHERE recipe_rank <= %s',
+            (*params, limit)
+        ))
+
+
+class Recipe(CounterFieldsMixin, models.Model):
     """Рецепты"""
     author = models.ForeignKey(
         User,
@@ -65,6 +104,12 @@ class Recipe(models.Model):
         'Фото',
         upload_to='recipes/images/'
     )
+    image_variants = models.JSONField(
+        'Уменьшенные копии фото',
+        default=dict,
+        blank=True,
+        editable=False,
+    )
     text = models.TextField(verbose_name='Описание')
     cooking_time = models.PositiveIntegerField(verbose_name='Время готовки')
     tags = models.ManyToManyField(Tag, verbose_name='Тэг')
@@ -76,19 +121,39 @@ class Recipe(models.Model):
         'Дата публикации',
         auto_now_add=True,
     )
+    updated = models.DateTimeField(
+        'Дата изменения',
+        auto_now=True,
+    )
+    favorites_count = models.PositiveIntegerField(
+        'Добавили в избранное',
+        default=0,
+        editable=False,
+        db_index=True,
+    )
+
+    counter_fields = ('favorites_count',)
+
+    objects = RecipeQuerySet.as_manager()
 
     class Meta:
-        ordering = ['-pub_date']
+        ordering = ['-pub_date', '-id']
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
+        indexes = [
+            models.Index(
+                fields=['-pub_date', '-id'],
+                name='recipe_pub_date_id_idx'
+            ),
+            models.Index(
+                fields=['author', '-pub_date', '-id'],
+                name='recipe_author_pub_date_idx'
+            ),
+        ]
 
     def __str__(self):
         return self.name
 
-    def favorite_count(self):
-        return self.favorite.count()
-    favorite_count.short_description = 'Добавили в избранное'
-
     def get_tags(self):
         return self.tags.all()
 
@@ -117,3 +182,138 @@ class AmountIngredient(models.Model):
                 fields=['recipe', 'ingredient']
             )
         ]
+
+
+class ShoppingListItem(models.Model):
+    """Суммарное количество ингредиента в списке покупок пользователя"""
+    user = models.ForeignKey(
+        User,
+        related_name='shopping_list',
+        on_delete=models.CASCADE,
+        verbose_name='Пользователь',
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        related_name='shopping_list_items',
+        on_delete=models.CASCADE,
+        verbose_name='Ингредиент',
+    )
+    amount = models.PositiveIntegerField(verbose_name='Количество')
+
+    class Meta:
+        verbose_name = 'Позиция списка покупок'
+        verbose_name_plural = 'Списки покупок'
+        constraints = [
+            models.UniqueConstraint(
+                name='unique_shopping_list_item',
+                fields=['user', 'ingredient']
+            )
+        ]
+
+    def __str__(self):
+        return f'{self.user} {self.ingredient}: {self.amount}'
+
+
+class TimelineEntry(models.Model):
+    """Рецепт автора в ленте подписчика. Дата публикации повторяется здесь,
+    чтобы лента читалась по одному индексу"""
+    user = models.ForeignKey(
+        User,
+        related_name='timeline',
+        on_delete=models.CASCADE,
+        verbose_name='Подписчик',
+    )
+    recipe = models.ForeignKey(
+        Recipe,
+        related_name='timeline_entries',
+        on_delete=models.CASCADE,
+        verbose_name='Рецепт',
+    )
+    author = models.ForeignKey(
+        User,
+        related_name='+',
+        on_delete=models.CASCADE,
+        verbose_name='Автор',
+    )
+    pub_date = models.DateTimeField('Дата публикации')
+
+    class Meta:
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Ленты подписок'
+        constraints = [
+            models.UniqueConstraint(
+                name='unique_timeline_entry',
+                fields=['user', 'recipe']
+            )
+        ]
+        indexes = [
+            models.Index(
+                fields=['user', '-pub_date', '-recipe'],
+                name='timeline_user_pub_date_idx'
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.user}: {self.recipe}'
+
+
+class PopularAuthor(models.Model):
+    """Автор, чьи рецепты не рассылаются по лентам подписчиков, а
+    подмешиваются при чтении ленты"""
+    author = models.OneToOneField(
+        User,
+        primary_key=True,
+        related_name='popular',
+        on_delete=models.CASCADE,
+        verbose_name='Автор',
+    )
+
+    class Meta:
+        verbose_name = 'Популярный автор'
+        verbose_name_plural = 'Популярные авторы'
+
+    def __str__(self):
+        return str(self.author)
+
+
+class Job(models.Model):
+    """Фоновая задача пользователя, например выгрузка списка покупок.
+    Выполняется командой run_jobs, результат сохраняется в файл"""
+
+    class Status(models.TextChoices):
+        QUEUED = 'queued', 'В очереди'
+        RUNNING = 'running', 'Выполняется'
+        DONE = 'done', 'Готово'
+        FAILED = 'failed', 'Ошибка'
+
+    user = models.ForeignKey(
+        User,
+        related_name='jobs',
+        on_delete=models.CASCADE,
+        verbose_name='Пользователь',
+    )
+    kind = models.CharField('Тип', max_length=50)
+    status = models.CharField(
+        'Статус',
+        max_length=10,
+        choices=Status.choices,
+        default=Status.QUEUED,
+    )
+    attempts = models.PositiveSmallIntegerField('Попыток', default=0)
+    result = models.FileField('Результат', upload_to='jobs/', blank=True)
+    filename = models.CharField('Имя файла', max_length=200, blank=True)
+    error = models.TextField('Ошибка', blank=True)
+    created = models.DateTimeField('Создана', auto_now_add=True)
+    started = models.DateTimeField('Начата', null=True, blank=True)
+    finished = models.DateTimeField('Завершена', null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created', '-id']
+        verbose_name = 'Задача'
+        verbose_name_plural = 'Задачи'
+        indexes = [
+            models.Index(fields=['status', 'id'], name='job_status_id_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.kind} #{self.pk}: {self.status}'
@@ -0,0 +1,108 @@
+import re
+
+from django.db import connection, models
+from django.db.models.expressions import RawSQL
+
+# Словарь PostgreSQL и веса: совпадение в названии важнее, чем в описании
+CONFIG = 'russian'
+FTS_TABLE = 'recipes_recipe_fts'
+
+VECTOR_SQL = (
+    f"setweight(to_tsvector('{CONFIG}', name), 'A') || "
+    f"setweight(to_tsvector('{CONFIG}', text), 'B')"
+)
+QUERY_SQL = f"websearch_to_tsquery('{CONFIG}', %s)"
+
+
+def _words(query):
+    return re.findall(r'\w+', query.lower())
+
+
+def _fts_match(query):
+    """Запрос FTS5: все слова, каждое как префикс (стемминга нет)"""
+    return ' '.join(f'"{word}"*' for word in _words(query))
+
+
+def matches(query):
+    """Условие для filter(): рецепт подходит под поисковый запрос.
+
+    None, если в запросе нет ни одного слова.
+    """
+    if not _words(query):
+        return None
+    if connection.vendor == 'postgresql':
+        return RawSQL(
+            f'recipes_recipe.search_vector @@ {QUERY_SQL}',
+            [query],
+            output_field=models.BooleanField(),
+        )
+    if connection.vendor == 'sqlite':
+        return RawSQL(
+            f'recipes_recipe.id IN (SELECT rowid FROM {FTS_TABLE} '
+            f'WHERE {FTS_TABLE} MATCH %s)',
+            [_fts_match(query)],
+            output_field=models.BooleanField(),
+        )
+    condition = models.Q()
+    for word in _words(query):
+        condition &= (
+            models.Q(name__icontains=word) | models.Q(text__icontains=word))
+    return condition
+
+
+def rank(query):
+    """Релевантность рецепта запросу, больше - лучше"""
+    if connection.vendor == 'postgresql':
+        return RawSQL(
+            f'ts_rank(recipes_recipe.search_vector, {QUERY_SQL})',
+            [query],
+            output_field=models.FloatField(),
+        )
+    if connection.vendor == 'sqlite':
+        return RawSQL(
+            f'(SELECT -bm25({FTS_TABLE}, 10.0, 1.0) FROM {FTS_TABLE} '
+            f'WHERE {FTS_TABLE} MATCH %s AND rowid = recipes_recipe.id)',
+            [_fts_match(query)],
+            output_field=models.FloatField(),
+        )
+    return models.Value(0.0, output_field=models.FloatField())
+
+
+def update_index(recipe_ids):
+    """Пересчитывает поисковый индекс рецептов после сохранения"""
+    recipe_ids = list(recipe_ids)
+    if not recipe_ids:
+        return
+    placeholders = ', '.join(['%s'] * len(recipe_ids))
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute(
+                f'UPDATE recipes_recipe SET search_vector = {VECTOR_SQL} '
+                f'WHERE id IN ({placeholders})',
+                recipe_ids
+            )
+        elif connection.vendor == 'sqlite':
+            cursor.execute(
+                f'DELETE FROM {FTS_TABLE} WHERE rowid IN ({placeholders})',
+                recipe_ids
+            )
+            cursor.execute(
+                f'INSERT INTO {FTS_TABLE} (rowid, name, text) '
+                f'SELECT id, name, text FROM recipes_recipe '
+                f'WHERE id IN ({placeholders})',
+                recipe_ids
+            )
+
+
+def remove_from_index(recipe_ids):
+    """Убирает удалённые рецепты из индекса FTS5. В PostgreSQL вектор
+    хранится в строке рецепта и удаляется вместе с ней"""
+    recipe_ids = list(recipe_ids)
+    if not recipe_ids or connection.vendor != 'sqlite':
+        return
+    placeholders = ', '.join(['%s'] * len(recipe_ids))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {FTS_TABLE} WHERE rowid IN ({placeholders})',
+            recipe_ids
+        )
@@ -0,0 +1,40 @@
+import hashlib
+import os
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """Файлы называются по SHA-256 содержимого: каталог/ab/abcd….jpg.
+
+    Одинаковые загрузки хранятся одним файлом, повторное сохранение того же
+    содержимого ничего не пишет. Поэтому один файл может принадлежать
+    нескольким рецептам, и удаляются файлы только командой gc_images.
+    Повторное сохранение обновляет время изменения файла: gc_images не
+    трогает свежие файлы, пока ссылка на них ещё не зафиксирована.
+    """
+
+    def get_content_name(self, name, content):
+        digest = hashlib.sha256()
+        for chunk in content.chunks():
+            digest.update(chunk)
+        digest = digest.hexdigest()
+        extension = os.path.splitext(name)[1].lower()
+        return os.path.join(
+            os.path.dirname(name), digest[:2], f'{digest}{extension}')
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        name = self.get_content_name(name, content)
+        if self.exists(name):
+            try:
+                os.utime(self.path(name))
+            except FileNotFoundError:
+                # Файл удалили между проверкой и обновлением
+                return super().save(name, content, max_length)
+            return name
+        return super().save(name, content, max_length)
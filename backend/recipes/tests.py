@@ -0,0 +1,62 @@
+import os
+import shutil
+import tempfile
+
+from django.core.files.base import ContentFile
+from django.test import TestCase, override_settings
+
+from users.models import User
+
+from .images import collect_garbage
+from .models import Recipe
+from .storage import ContentAddressedStorage
+
+MEDIA_ROOT = tempfile.mkdtemp(prefix='foodgram_test_media_')
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class ContentAddressedStorageTest(TestCase):
+    """Файлы по содержимому и сборка мусора"""
+
+    def setUp(self):
+        self.storage = ContentAddressedStorage()
+        self.addCleanup(shutil.rmtree, MEDIA_ROOT, True)
+
+    def save(self, content):
+        return self.storage.save(
+            'recipes/images/photo.png', ContentFile(content))
+
+    def age(self, name, seconds):
+        path = self.storage.path(name)
+        mtime = os.path.getmtime(path) - seconds
+        os.utime(path, (mtime, mtime))
+
+    def test_same_content_same_file(self):
+        name = self.save(b'photo')
+        self.assertEqual(self.save(b'photo'), name)
+        self.assertNotEqual(self.save(b'other'), name)
+
+    def test_dedup_touches_file(self):
+        name = self.save(b'photo')
+        self.age(name, 3600)
+        self.save(b'photo')
+        self.assertEqual(collect_garbage(60, dry_run=True), (0, 0))
+
+    def test_collect_garbage(self):
+        kept = self.save(b'kept')
+        deleted = self.save(b'deleted')
+        fresh = self.save(b'fresh')
+        self.age(kept, 3600)
+        self.age(deleted, 3600)
+        Recipe.objects.create(
+            author=User.objects.create_user(
+                'author@example.com', 'author', 'password'),
+            name='Рецепт',
+            text='Описание',
+            cooking_time=10,
+            image=kept,
+        )
+        self.assertEqual(collect_garbage(60), (1, len(b'deleted')))
+        self.assertTrue(self.storage.exists(kept))
+        self.assertFalse(self.storage.exists(deleted))
+        self.assertTrue(self.storage.exists(fresh))
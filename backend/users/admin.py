@@ -16,7 +16,8 @@ class SubscriptionInLine(admin.TabularInline):
 @admin.register(User)
 class UserAdmin(admin.ModelAdmin):
     list_display_links = ['username']
-    list_display = ['id', 'username', 'email']
+    list_display = ['id', 'username', 'email', 'recipes_count',
+                    'followers_count']
     search_fields = ['username', 'email', 'first_name', 'last_name']
     list_filter = ['username', 'email']
     inlines = [SubscriptionInLine]